@@ -6,19 +6,31 @@
 	List of Functions:
 		uniquify
 		csvline_to_list
+		iter_csv
+		csv_columns
 		csv2LD
 		csv2html
 		matchScore
 		numConvert
 		update
 	Module dependencies: 
+		cgi
+		csv
+		hashlib
+		itertools
 		math
+		os
 		re
 		time
 '''
 
+import os
 import re
+import cgi
+import csv
+import hashlib
 import time
+import itertools
 import math
 
 #===============================================================================
@@ -54,46 +66,159 @@ def csvline_to_list(lineStr):
 # END csvline_to_list
 
 #===============================================================================
-def csv2LD(fileName):
+def iter_csv(source, schema=None, header=True):
+	'''Typed CSV Row Iterator
+	
+	Streams the rows of a csv file as tuples of typed values.  Quoting is
+	handled by the csv module, so quoted fields may hold commas and doubled
+	quotes, and text fields are stripped of surrounding spaces and tabs.
+	
+	Args:
+		source (str|iterable): file name, or lines of csv text such as an
+			open file
+		schema = None (list): [(column name, type), ...] for the columns to
+			read, type being str or a conversion function such as int.
+			Columns are found by name in the header if there is one, and
+			taken in order otherwise.  All columns, as str, by default
+		header = True (bool): whether the first line holds column names
+	Yields:
+		tuple.  The values of a row, in schema order
+	'''
+	if isinstance(source, basestring):
+		return _iter_csv_file(source, schema, header)
+	else:
+		return _csv_reader(source, schema, header)[1]
+	# END if
+# END iter_csv
+
+def _iter_csv_file(file_name, schema, header):
+	'''Yield the rows of a csv file, closing it once they are read
+	'''
+	with open(file_name) as f:
+		for row in _csv_reader(f, schema, header)[1]: yield row
+	# END with
+# END _iter_csv_file
+
+#===============================================================================
+def csv_columns(source, schema=None, header=True):
+	'''Typed CSV Column Reader
+	
+	Args:
+		source, schema, header: as for iter_csv
+	Returns:
+		dict.  Lists of the values of each column, keyed by column name
+	'''
+	if isinstance(source, basestring):
+		with open(source) as f:
+			return csv_columns(f, schema, header)
+		# END with
+	# END if
+	
+	(names, rows) = _csv_reader(source, schema, header)
+	cols = zip(*rows)
+	if len(cols) == 0: cols = [()] * len(names)
+	
+	return dict( (nm, list(col)) for (nm, col) in zip(names, cols) )
+# END csv_columns
+
+_csv_strip = ' \t'
+def _csv_text(v):
+	return v.strip(_csv_strip)
+# END _csv_text
+
+def _csv_reader(lines, schema, header):
+	'''Set up the parsing of csv lines, returns (column names, row iterator)
+	'''
+	reader = csv.reader(lines, skipinitialspace=True)
+	if header:
+		hdr = [v.strip(_csv_strip) for v in next(reader, [])]
+	elif schema is None:
+		raise ValueError('a schema is needed for csv text without a header')
+	# END if
+	if schema is None: schema = [(nm, str) for nm in hdr]
+	names = [nm for (nm, typ) in schema]
+	
+	if header:
+		try:
+			iCols = [hdr.index(nm) for nm in names]
+		except ValueError:
+			missing = [nm for nm in names if nm not in hdr]
+			raise ValueError('csv columns {0} not found'.format(missing))
+		# END try
+	else:
+		iCols = range(len(schema))
+	# END if
+	
+	# (column index, conversion) of each value of a row
+	convs = [
+		(i, (_csv_text if typ is str else typ))
+		for ((nm, typ), i) in zip(schema, iCols)
+	]
+	def parse(row):
+		return tuple([conv(row[i]) for (i, conv) in convs])
+	# END parse
+	
+	# blank lines are read as empty rows
+	return names, itertools.imap(parse, itertools.ifilter(None, reader))
+# END _csv_reader
+
+#===============================================================================
+def csv2LD(fileName, columns=None, stream=False, arrays=False):
 	'''Convert CSV file to line-wise list of dictionaries
 	
 	This function will open a csv file and create a line-wise list of
 	dictionaries based on each line keyed with the values of the first line
-	(assumed to be column headers)
+	(assumed to be column headers).  It can instead stream the dictionaries
+	one line at a time, or read only some of the columns into one list (or
+	numpy array) per column.
 	
 	Arg:
 		fileName (str): The file of interest's name
+		columns = None (list): names of the columns to read, or a schema of
+			(column name, type) pairs as for iter_csv.  If given, the file
+			is read column-wise
+		stream = False (bool): if True, yield the dictionaries one at a time,
+			the file being closed once they have all been read
+		arrays = False (bool): if True, columns are returned as numpy arrays
 	Returns:
-		list.  Line-wise list of header-keyed dictionaries
+		list.  Line-wise list of header-keyed dictionaries, or
+		generator.  Of the same dictionaries if stream is True, or
+		dict.  Of column lists (or arrays) keyed by name if columns are given
 	'''
-	f = open(fileName)
-	
-	keys = csvline_to_list(f.readline())
-	iCols = range(0, len(keys))
+	if columns is not None:
+		schema = [
+			((col, str) if isinstance(col, basestring) else tuple(col))
+			for col in columns
+		]
+		cols = csv_columns(fileName, schema)
+		if arrays:
+			import numpy as np
+			for (col, typ) in schema: cols[col] = np.array(cols[col])
+		# END if
+		return cols
+	elif stream:
+		return _iter_csv_dicts(fileName)
+	# END if
 	
-	out = []
-	for l in f:
-		vals = csvline_to_list(l)
-		lnDict = {}
-		for i in iCols:
-			lnDict[keys[i]] = vals[i]
-		
-		out.append(lnDict)
+	with open(fileName) as f:
+		(keys, rows) = _csv_reader(f, None, True)
+		out = [dict(zip(keys, vals)) for vals in rows]
+	# END with
 	
 	return out
 # END csv2LD
 
-#===============================================================================
-def csv2html(csvFileName, addStyle=''):
-	'''Convert CSV file to a table in an html page
-	
-	Args:
-		csvFileName (str): The file of interest's name
-		addStyle = '': string containing custom CSS for the page
-	Returns: -none-
+def _iter_csv_dicts(fileName):
+	'''Yield the lines of a csv file as header-keyed dictionaries
 	'''
-	htmlTxt = '''
-<html>
+	with open(fileName) as f:
+		(keys, rows) = _csv_reader(f, None, True)
+		for vals in rows: yield dict(zip(keys, vals))
+	# END with
+# END _iter_csv_dicts
+
+#===============================================================================
+_html_head = '''<html>
 
 <head>
 <script
@@ -116,42 +241,172 @@ def csv2html(csvFileName, addStyle=''):
 </head>
 
 <body>
-<table class="sortable">
-	<tr>'''.format(addStyle)
+'''
+_html_tail = '''
+</body>
+
+</html>'''
+
+def csv2html(csvFileName, addStyle='', rowsPerPage=None, force=False):
+	'''Convert CSV file to a table in an html page
+	
+	Rows are written to the page as they are read.  Large tables can be
+	split into pages of rowsPerPage rows, "<name>_p1.html", "<name>_p2.html",
+	..., linked to each other and listed on an index page written in place
+	of the single page.  The md5 hash of the csv file and the options is
+	kept in a comment on the first line of the main page, and the pages are
+	only rewritten when it changes.  The main page is written to a temporary
+	file and moved into place once it is complete, so an interrupted run is
+	redone by the next one.
 	
-	f = open(csvFileName)
-	headers = csvline_to_list(f.readline())
-	for v in headers:
-		htmlTxt += '''
-		<th>{0}</th>'''.format(v)
+	Args:
+		csvFileName (str): The file of interest's name
+		addStyle = '': string containing custom CSS for the page
+		rowsPerPage = None (int): rows per page, all rows on one page by
+			default
+		force = False (bool): if True, rewrite the pages even if the csv
+			file has not changed
+	Returns:
+		list.  Names of the html files written, empty if they were up to
+			date
+	'''
+	htmlFileName = re.sub(r'(?<=\.)csv(?=$)', 'html', csvFileName)
+	pageName = re.sub(r'\.html$', '_p{0}.html', htmlFileName)
 	
-	htmlTxt += '''
-	</tr>'''
+	# Hash the csv file and options, and compare with the last pages' hash
+	md5 = hashlib.md5()
+	with open(csvFileName, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 16), ''): md5.update(chunk)
+	# END with
+	md5.update( repr((addStyle, rowsPerPage)) )
+	stamp = '<!-- csv2html source md5 {0} -->\n'.format(md5.hexdigest())
+	if not force and os.path.exists(htmlFileName):
+		with open(htmlFileName) as f:
+			if f.readline() == stamp: return []
+		# END with
+	# END if
 	
-	for l in f:
-		htmlTxt += '''
-	<tr>'''
-		lnVals = csvline_to_list(l)
-		for v in lnVals:
-			htmlTxt += '''
-		<td>{0}</td>'''.format(v)
+	written = []
+	pageRows = []
+	with open(csvFileName) as fin:
+		# escaping "&", "<" and ">" leaves the csv structure as it was
+		(headers, rows) = _csv_reader(
+			itertools.imap(cgi.escape, fin), None, True
+		)
+		tableHead = '<table class="sortable">\n\t<tr>{0}\n\t</tr>'.format(
+			''.join('\n\t\t<th>{0}</th>'.format(v) for v in headers)
+		)
 		
-		htmlTxt += '''
-	</tr>'''
+		if rowsPerPage is None:
+			def write_page(f):
+				f.write(stamp)
+				f.write( _html_head.format(addStyle) )
+				_write_html_table(f, tableHead, rows)
+				f.write(_html_tail)
+			# END write_page
+			_write_file_atomic(htmlFileName, write_page)
+			nextRow = None
+		else:
+			nextRow = next(rows, None)
+		# END if
+		
+		while nextRow is not None:
+			k = len(written) + 1
+			with open(pageName.format(k), 'w') as f:
+				f.write( _html_head.format(addStyle) )
+				pageRows.append( _write_html_table(
+					f, tableHead, itertools.chain(
+						[nextRow], itertools.islice(rows, rowsPerPage-1)
+					)
+				) )
+				nextRow = next(rows, None)
+				
+				links = ['<a href="{0}">index</a>'.format(
+					os.path.basename(htmlFileName)
+				)]
+				if k > 1:
+					links.insert(0, '<a href="{0}">previous</a>'.format(
+						os.path.basename(pageName.format(k-1))
+					))
+				# END if
+				if nextRow is not None:
+					links.append('<a href="{0}">next</a>'.format(
+						os.path.basename(pageName.format(k+1))
+					))
+				# END if
+				f.write( '\n<p>{0}</p>'.format(' | '.join(links)) )
+				f.write(_html_tail)
+			# END with
+			written.append(pageName.format(k))
+		# END while
+	# END with
 	
-	htmlTxt += '''
-</table>
-</body>
-
-</html>'''
+	# Remove pages left from a longer or paged table
+	k = len(written) + 1
+	while os.path.exists(pageName.format(k)):
+		os.remove(pageName.format(k))
+		k += 1
+	# END while
+	if rowsPerPage is None: return [htmlFileName]
 	
-	f.close()
+	def write_index(f):
+		f.write(stamp)
+		f.write( _html_head.format(addStyle) )
+		f.write('<ul>')
+		nRows = 0
+		for (k, fileName) in enumerate(written):
+			f.write(
+				'\n\t<li><a href="{0}">rows {1} to {2}</a></li>'.format(
+					os.path.basename(fileName), nRows+1, nRows+pageRows[k]
+				)
+			)
+			nRows += pageRows[k]
+		# END for
+		f.write('\n</ul>')
+		f.write(_html_tail)
+	# END write_index
+	_write_file_atomic(htmlFileName, write_index)
+	written.append(htmlFileName)
 	
-	htmlFileName = re.sub(r'(?<=\.)csv(?=$)', 'html', csvFileName)
-	f = open(htmlFileName, 'w')
-	f.write(htmlTxt)
-	f.close()
-# END csv2LD
+	return written
+# END csv2html
+
+def _write_file_atomic(fileName, write):
+	'''Call write with a temporary file, then move it to fileName
+	'''
+	tmpName = fileName + '.tmp'
+	try:
+		with open(tmpName, 'w') as f:
+			write(f)
+		# END with
+		if os.path.exists(fileName) and os.name == 'nt':
+			# rename does not replace files on windows
+			os.remove(fileName)
+		# END if
+		os.rename(tmpName, fileName)
+	except:
+		if os.path.exists(tmpName): os.remove(tmpName)
+		raise
+	# END try
+# END _write_file_atomic
+
+def _write_html_table(f, tableHead, rows):
+	'''Write rows of html-escaped values to an html table, returns the
+	number of rows
+	'''
+	f.write(tableHead)
+	n = 0
+	for vals in rows:
+		f.write(
+			'\n\t<tr>\n\t\t<td>' + '</td>\n\t\t<td>'.join(vals) +
+			'</td>\n\t</tr>'
+		)
+		n += 1
+	# END for
+	f.write('\n</table>')
+	
+	return n
+# END _write_html_table
 
 #===============================================================================
 def matchScore(A, B):
@@ -239,11 +494,22 @@ def numConvert(x, fromBase, toBase):
 # END numConvert
 
 #===============================================================================
-def update(total, count, count_lock, interval=2):
+def update(total, count, count_lock, interval=2, stop=None):
+	'''Print progress reports on a shared counter every interval seconds
+	
+	Args:
+		total (int): number of units of work expected
+		count: object with a "value" attribute counting finished work
+		count_lock: lock guarding count
+		interval = 2: seconds between reports
+		stop = None: optional threading/multiprocessing Event, the reports end
+			once it is set, otherwise they run until the process is terminated
+	Returns: -none-
+	'''
 	t_0 = time.time()
 	T = [0, 0, 0]
 	N = [0, 0, 0]
-	while True:
+	while stop is None or not stop.is_set():
 		with count_lock: n = count.value
 		N.append(n)
 		N.pop(0)
@@ -285,7 +551,11 @@ def update(total, count, count_lock, interval=2):
 		# END if
 		
 		print out_str
-		time.sleep(interval)
+		if stop is None:
+			time.sleep(interval)
+		else:
+			stop.wait(interval)
+		# END if
 	# END while
 # END update
 
@@ -4,33 +4,86 @@
 	
 	List of classes:
 		SeasonData
+		LazyGames
 		Game
 		Bout
+		PlayStore
+		GameLog
+		EloRater
 		EmptyGameError
+		Ranking
 	List of functions:
+		box_scores
+		build_play_store
+		classify_play
+		colleyRank
+		iter_games
+		load_seasons
+		masseyRank
+		predictAllPairs
+		predictFutureGms
 		predictGm
+		predictGms
 		valueGm
+		valueGms
+		rwBootstrap
+		rwHistory
 		rwRank
+		rwRankSeasons
 	Module dependencies: 
 		ampLib
-		ampMath
+		array
+		bisect
+		collections
 		core
+		datetime
 		math
+		multiprocessing
+		numpy
 		numpy.linalg
+		os
 		re
 		scipy
+		scipy.sparse
+		scipy.sparse.csgraph
+		scipy.sparse.linalg
 		scipy.special
 '''
 
 import core
+import os
 import re
+import array
+import datetime
+import bisect
+import multiprocessing as mp
+from collections import OrderedDict, namedtuple
 import ampLib
-import ampMath
 from math import sqrt
+import numpy as np
 import scipy as sp
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
 from scipy.special import erf, erfinv
 from numpy.linalg import norm
 
+# Play type codes, see classify_play
+PLAY_OTHER = 0
+PLAY_SKIP = 1
+PLAY_TURNOVER = 2
+PLAY_FGA = 3
+PLAY_FOUL = 4
+PLAY_END = 5
+PLAY_FT = 6
+
+# Home edge and standard deviation in score difference, by gender
+GM_SCORE_PARAMS = {'M': (4.45703, 12.75732), 'W': (3.94315, 16.36411)}
+
+# One team's line of a ranking: team name, team id, rank, rating value,
+# points over the median team, games played, games won
+Ranking = namedtuple('Ranking', ['tm', 'tmPID', 'rnk', 'v', 'pnts', 'N', 'W'])
+
 
 #===============================================================================
 class SeasonData(object):
@@ -42,88 +95,232 @@ class SeasonData(object):
 	Instantiation Args:
 		arg (str|core.League|core.SeasonName): Object indicating the season or
 			file name (str) of XML database
+		gm_hcs = None (list): hashcodes of the only games to load, these are
+			read through the database's core.PbpIndex without scanning it
+		lazy = False: if True only the database's core.PbpIndex is read and
+			each Game is parsed the first time it is used
+		cache_size = None (int): in lazy mode, the most parsed Game objects to
+			keep, least recently used first out, None keeps all of them
+		procs = 1 (int|multiprocessing.pool.Pool): number of processes to
+			parse the database with, or a pool of processes to use
+	Alternate Constructors:
+		from_play_store
 	Instance Attributes:
+		sn (core.SeasonName)
+		file_name (str)
 		leag (core.League)
-		gms (dict): Dict of non-empty Game objects keyed by hashcode (str)
+		gms (dict): Dict of non-empty Game objects keyed by hashcode (str), a
+			dict-like LazyGames in lazy mode
 		gm_hcs (list): List of keys for gms
 		empty_gms (list): List of hashcodes (str) of games without pbp data
+		pbp_index (core.PbpIndex): database index in lazy mode, else None
+		tm_gm_hcs (dict): sorted lists of the hashcodes in gm_hcs keyed by
+			the prime hash value (int) of each team playing in them
+		date_gm_hcs (dict): sorted lists of the hashcodes in gm_hcs keyed
+			by date (str, yyyymmdd)
+		matchup_gm_hcs (dict): sorted lists of the hashcodes in gm_hcs keyed
+			by (home team, visiting team) prime hash values
 	Class Methods:
+		add_game
+		get_date_gms
+		get_h2h_gms
 		get_tm_schd
 	'''
 	
-	def __init__(self, arg):
-		if type(arg) is str:
-			try:
-				gy = re.search(
-					r'^pbp_data_(M|W)_(\d\d)-\d\d\.xml$', arg
-				).groups()
-			except Exception as err:
-				raise type(err)('file name, "{0}", not vaild'.format(arg))
-			# END try
-			self.sn = core.SeasonName(gy[0], '20'+gy[1])
-			
-			self.leag = core.League(self.sn)
-		elif type(arg) is core.League:
-			self.leag = arg
-			self.sn = self.leag.sn
-		elif type(arg) is core.SeasonName:
-			self.sn = arg
-			self.leag = core.League(self.sn)
-		else:
-			raise TypeError(
-				'SeasonData initalization argument must be ' +
-				'a file name (str), a core.League, or a core.SeasonName'
-			)
-		# END if
-		
+	def __init__(
+		self, arg, gm_hcs=None, lazy=False, cache_size=None, procs=1
+	):
+		self.sn, self.leag = _parse_season_arg(arg)
+		self.file_name = 'pbp_data_{0}.xml'.format(self.sn)
 		self.gms = {}
 		self.gm_hcs = []
 		self.empty_gms = []
-		with open('pbp_data_{0}.xml'.format(self.sn)) as f:
-			pbp_csv = ''
-			for ln in f:
-				if ln[0] != '<':
-					pbp_csv += ln
-				elif ln[1] == 'g':
-					gmhc = re.search(r'^<game id="([^"]+)">', ln).group(1)
-				elif ln[1] == 'h':
-					hm_nm = re.search(r'^<home>([^<>]+)', ln).group(1)
-				elif ln[1] == 'v':
-					vs_nm = re.search(r'^<visitor>([^<>]+)', ln).group(1)
-				elif ln == '</game>\n':
-					try:
-						hm = self.leag(hm_nm)
-						vs = self.leag(vs_nm)
-						self.gms[gmhc] = Game(gmhc, hm, vs, pbp_csv)
-						self.gm_hcs.append(gmhc)
-					except EmptyGameError as err:
-						self.empty_gms.append(gmhc)
-						print str(err)
-					# END try
-					pbp_csv = ''
+		self.pbp_index = None
+		self.tm_gm_hcs = {}
+		self.date_gm_hcs = {}
+		self.matchup_gm_hcs = {}
+		if lazy:
+			self.pbp_index = core.PbpIndex(self.file_name, self.leag)
+			if gm_hcs is None: gm_hcs = self.pbp_index.gm_hcs
+			for gmhc in gm_hcs:
+				# record = (offset, length, date, hm_phv, vs_phv, n_plays)
+				rec = self.pbp_index[gmhc]
+				if rec[5] < 1:
+					self.empty_gms.append(gmhc)
+				else:
+					self.gm_hcs.append(gmhc)
+					self._index_game(gmhc, rec[3], rec[4])
 				# END if
 			# END for
-		# END with
+			self.gms = LazyGames(
+				self.pbp_index, self.leag, self.gm_hcs, cache_size
+			)
+		elif gm_hcs is None and procs != 1:
+			self._load_parallel(procs)
+		elif gm_hcs is None:
+			with open(self.file_name) as f:
+				self._load_lines(f)
+			# END with
+		else:
+			pbp_index = core.PbpIndex(self.file_name, self.leag)
+			try:
+				self._load_lines(
+					ln for (gmhc, entry) in pbp_index.read_entries(gm_hcs)
+					for ln in entry.splitlines(True)
+				)
+			finally:
+				pbp_index.close()
+			# END try
+		# END if
 		
 		self.gm_hcs.sort()
 	# END __init__
 	
-	def __iter__(self):
-		for gmhc in self.gm_hcs:
-			yield self.gms[gmhc]
-	# END __iter__
+	def _load_lines(self, lines):
+		'''Parse lines of the pbp-xml database into Game objects
+		'''
+		for (gmhc, gm) in _parse_entries(lines, self.leag):
+			if isinstance(gm, EmptyGameError):
+				self.empty_gms.append(gmhc)
+				print str(gm)
+			else:
+				self.gms[gmhc] = gm
+				self.gm_hcs.append(gmhc)
+				self._index_game(gmhc, gm.hm.phv, gm.vs.phv)
+			# END if
+		# END for
+	# END _load_lines
 	
-	def get_tm_schd(self, tm):
-		'''Get Team Schedule
+	def _index_game(self, gmhc, hm_phv, vs_phv):
+		'''Add a game to the team, date and matchup indexes
+		'''
+		for (lut, key) in [
+			(self.tm_gm_hcs, hm_phv), (self.tm_gm_hcs, vs_phv),
+			(self.date_gm_hcs, gmhc[:8]),
+			(self.matchup_gm_hcs, (hm_phv, vs_phv))
+		]:
+			if key not in lut: lut[key] = []
+			# a game against a team's own phv (non-D1 vs. non-D1) is listed
+			# once
+			i = bisect.bisect_left(lut[key], gmhc)
+			if i == len(lut[key]) or lut[key][i] != gmhc:
+				lut[key].insert(i, gmhc)
+			# END if
+		# END for
+	# END _index_game
+	
+	def add_game(self, gm):
+		'''Add a Game to the season, keeping gm_hcs and the indexes sorted
 		
-		Given a Team object or a team's name as a string this function returns
-		a sorted list of that team's games
+		Args:
+			gm (Game): game of this season, replaces any with its hashcode
+		Returns: None
+		'''
+		if gm.hc not in self.gms:
+			bisect.insort(self.gm_hcs, gm.hc)
+			self._index_game(gm.hc, gm.hm.phv, gm.vs.phv)
+		# END if
+		self.gms[gm.hc] = gm
+	# END add_game
+	
+	def _load_parallel(self, procs):
+		'''Parse the database in game-aligned chunks on a process pool
+		
+		Workers send back each game's plays with teams replaced by side codes,
+		the Game objects are built here in database order so the result is
+		the same as loading serially.
+		'''
+		if isinstance(procs, int):
+			pool = mp.Pool(procs)
+			n_chunks = 4*procs
+		else:
+			pool = procs
+			n_chunks = 4*mp.cpu_count()
+		# END if
+		
+		pbp_index = core.PbpIndex(self.file_name, self.leag)
+		try:
+			chunk_results = [
+				pool.apply_async(_load_chunk, (self.file_name, start, stop))
+				for (start, stop) in pbp_index.chunks(n_chunks)
+			]
+			for chunk_result in chunk_results:
+				for (gmhc, hm_nm, vs_nm, plays_keys, plays) in chunk_result.get():
+					hm = self.leag(hm_nm)
+					vs = self.leag(vs_nm)
+					if plays is None:
+						self.empty_gms.append(gmhc)
+						print str( EmptyGameError(gmhc, hm.name, vs.name) )
+						continue
+					# END if
+					
+					self.gms[gmhc] = Game.from_plays(
+						gmhc, hm, vs, plays_keys, plays
+					)
+					self.gm_hcs.append(gmhc)
+					self._index_game(gmhc, hm.phv, vs.phv)
+				# END for
+			# END for
+		finally:
+			pbp_index.close()
+			if pool is not procs:
+				pool.close()
+				pool.join()
+			# END if
+		# END try
+	# END _load_parallel
+	
+	@classmethod
+	def from_play_store(cls, arg):
+		'''Load a season from its columnar PlayStore
+		
+		Games are backed by the store's memory-mapped columns and only build
+		their list of plays when it is first used.
 		
 		Args:
-			tm (Team|str): Team identifier
+			arg (str|core.League|core.SeasonName): season, as for SeasonData
 		Returns:
-			list. [Game, Game, ...]
+			SeasonData.
 		'''
+		sd = cls.__new__(cls)
+		sd.sn, sd.leag = _parse_season_arg(arg)
+		sd.file_name = 'pbp_data_{0}.xml'.format(sd.sn)
+		sd.store = PlayStore(sd.leag)
+		sd.pbp_index = None
+		sd.gms = {}
+		sd.gm_hcs = []
+		sd.empty_gms = []
+		sd.tm_gm_hcs = {}
+		sd.date_gm_hcs = {}
+		sd.matchup_gm_hcs = {}
+		
+		n_plays = np.diff(sd.store.gm_start)
+		hm_codes = sd.store.hm.tolist()
+		vs_codes = sd.store.vs.tolist()
+		for (i, gmhc) in enumerate( sd.store.gm_hcs.tolist() ):
+			hm = sd.leag(sd.store.tm_nms[hm_codes[i]])
+			vs = sd.leag(sd.store.tm_nms[vs_codes[i]])
+			if n_plays[i] < 1:
+				sd.empty_gms.append(gmhc)
+				print str( EmptyGameError(gmhc, hm.name, vs.name) )
+				continue
+			# END if
+			
+			sd.gms[gmhc] = Game.from_play_store(sd.store, i, hm, vs)
+			sd.gm_hcs.append(gmhc)
+			sd._index_game(gmhc, hm.phv, vs.phv)
+		# END for
+		
+		sd.gm_hcs.sort()
+		return sd
+	# END from_play_store
+	
+	def __iter__(self):
+		for gmhc in self.gm_hcs:
+			yield self.gms[gmhc]
+	# END __iter__
+	
+	def _get_tm(self, tm):
 		if type(tm) is str:
 			if tm not in self.leag.registry:
 				raise ValueError(
@@ -135,16 +332,158 @@ class SeasonData(object):
 			tm = self.leag(tm)
 		# END if
 		
-		tm_schd = []
-		for gm in self:
-			if gm.hm == tm or gm.vs == tm:
-				tm_schd.append(gm)
-		# END for
+		return tm
+	# END _get_tm
+	
+	def _get_gms(self, gm_hcs, tms):
+		# all non-D1 teams share one prime hash value, so their games are
+		# checked against the teams themselves
+		gms = [self.gms[gmhc] for gmhc in gm_hcs]
+		if any(not tm.D1 for tm in tms):
+			gms = [gm for gm in gms if gm.hm in tms or gm.vs in tms]
+		# END if
+		return gms
+	# END _get_gms
+	
+	def get_tm_schd(self, tm):
+		'''Get Team Schedule
+		
+		Given a Team object or a team's name as a string this function returns
+		a sorted list of that team's games
 		
-		return tm_schd
+		Args:
+			tm (Team|str): Team identifier
+		Returns:
+			list. [Game, Game, ...]
+		'''
+		tm = self._get_tm(tm)
+		return self._get_gms(self.tm_gm_hcs.get(tm.phv, []), [tm])
 	# END get_tm_schd
+	
+	def get_h2h_gms(self, tm_a, tm_b):
+		'''Get Head-to-Head Games
+		
+		Returns a sorted list of the games between two teams, at either team's
+		home or at neutral sites
+		
+		Args:
+			tm_a (Team|str): Team identifier
+			tm_b (Team|str): Team identifier
+		Returns:
+			list. [Game, Game, ...]
+		'''
+		tm_a = self._get_tm(tm_a)
+		tm_b = self._get_tm(tm_b)
+		gm_hcs = self.matchup_gm_hcs.get( (tm_a.phv, tm_b.phv), [] )
+		if tm_a.phv != tm_b.phv:
+			gm_hcs = sorted(
+				gm_hcs + self.matchup_gm_hcs.get( (tm_b.phv, tm_a.phv), [] )
+			)
+		# END if
+		
+		gms = self._get_gms(gm_hcs, [tm_a, tm_b])
+		if not tm_a.D1 or not tm_b.D1:
+			gms = [
+				gm for gm in gms
+				if set([gm.hm, gm.vs]) == set([tm_a, tm_b])
+			]
+		# END if
+		return gms
+	# END get_h2h_gms
+	
+	def get_date_gms(self, date):
+		'''Get the sorted list of the games played on a date
+		
+		Args:
+			date (str|int): yyyymmdd
+		Returns:
+			list. [Game, Game, ...]
+		'''
+		return [self.gms[gmhc] for gmhc in self.date_gm_hcs.get(str(date), [])]
+	# END get_date_gms
 # END SeasonData
 
+#===============================================================================
+class LazyGames(object):
+	'''Lazily Parsed Game Dictionary Class
+	
+	Dict-like stand-in for SeasonData.gms.  A Game is parsed out of the
+	pbp-xml database the first time it is looked up and then kept in a
+	least-recently-used cache.  Games set by item assignment are not in the
+	database, so they are kept resident and never evicted.
+	
+	Instantiation Args:
+		pbp_index (core.PbpIndex): index of the pbp-xml database
+		leag (core.League): league of the season
+		gm_hcs (list): hashcodes (str) of the games available
+		cache_size = None (int): most parsed games kept, None keeps them all
+	Instance Attributes:
+		cache_size (int)
+	Class Methods:
+		__contains__
+		__getitem__
+		__iter__
+		__len__
+		__setitem__
+		get
+		keys
+	'''
+	
+	def __init__(self, pbp_index, leag, gm_hcs, cache_size=None):
+		self.cache_size = cache_size
+		self._index = pbp_index
+		self._leag = leag
+		self._gm_hcs = set(gm_hcs)
+		self._cache = OrderedDict()
+		self._added = {}
+	# END __init__
+	
+	def __contains__(self, gmhc):
+		return gmhc in self._gm_hcs
+	# END __contains__
+	
+	def __getitem__(self, gmhc):
+		if gmhc in self._added: return self._added[gmhc]
+		try:
+			gm = self._cache.pop(gmhc)
+		except KeyError:
+			if gmhc not in self._gm_hcs: raise
+			entry = self._index.read_entry(gmhc)
+			gm = next( _parse_entries(entry.splitlines(True), self._leag) )[1]
+		# END try
+		
+		self._cache[gmhc] = gm
+		if self.cache_size is not None and len(self._cache) > self.cache_size:
+			self._cache.popitem(last=False)
+		# END if
+		
+		return gm
+	# END __getitem__
+	
+	def __setitem__(self, gmhc, gm):
+		self._cache.pop(gmhc, None)
+		self._added[gmhc] = gm
+		self._gm_hcs.add(gmhc)
+	# END __setitem__
+	
+	def __iter__(self):
+		return iter(self._gm_hcs)
+	# END __iter__
+	
+	def __len__(self):
+		return len(self._gm_hcs)
+	# END __len__
+	
+	def get(self, gmhc, default=None):
+		if gmhc not in self._gm_hcs: return default
+		return self[gmhc]
+	# END get
+	
+	def keys(self):
+		return list(self._gm_hcs)
+	# END keys
+# END LazyGames
+
 #===============================================================================
 class Game(object):
 	'''Basketball Game Class
@@ -155,7 +494,11 @@ class Game(object):
 		hashcode (str): Game hashcode
 		hm (Team): home team.
 		vs (Team): visiting team.
-		pbp_csv (str): String containing csv formated play-by-play data.
+		pbp_csv (str|list): String containing csv formated play-by-play data,
+			or a list of its lines
+	Alternate Constructors:
+		from_plays
+		from_play_store
 	Class Attributes: none
 	Instance Attributes:
 		hc (str): Game hashcode
@@ -166,35 +509,108 @@ class Game(object):
 		vs (Team)
 		plays (list)
 		pbp_keys (list)
+		ptypes (list): play type code of each play, see classify_play
 	Class Methods:
 		__iter__
 	'''
 	
 	def __init__(self, hashcode, hm, vs, pbp_csv):
+		self._set_header(hashcode, hm, vs)
+		
+		parsed = _parse_pbp_csv(pbp_csv)
+		if parsed is None:
+			raise EmptyGameError(hashcode, hm.name, vs.name)
+		# END if
+		
+		# pbpKeys = [period, time, vs_sc, hm_sc, team, play]
+		self.plays_keys, rows = parsed
+		# End of period lines have no team, these get None
+		self._plays = [
+			(per, time, vs_sc, hm_sc, self.teams.get(tm_nm), desc)
+			for (per, time, vs_sc, hm_sc, tm_nm, desc) in rows
+		]
+		self._ptypes = None
+	# END __init__
+	
+	@classmethod
+	def from_plays(cls, hashcode, hm, vs, plays_keys, plays):
+		'''Make a Game from already parsed plays
+		
+		Args:
+			hashcode (str): Game hashcode
+			hm (Team): home team
+			vs (Team): visiting team
+			plays_keys (list): pbp column names
+			plays (list): [(period, time, vs_sc, hm_sc, side, play), ...] where
+				side is 1 for the home team, 2 for the visitor and 0 for neither
+		Returns:
+			Game.
+		'''
+		gm = cls.__new__(cls)
+		gm._set_header(hashcode, hm, vs)
+		gm.plays_keys = plays_keys
+		sides = (None, hm, vs)
+		gm._plays = [
+			(per, time, vs_sc, hm_sc, sides[side], desc)
+			for (per, time, vs_sc, hm_sc, side, desc) in plays
+		]
+		gm._ptypes = None
+		return gm
+	# END from_plays
+	
+	def _set_header(self, hashcode, hm, vs):
 		self.hc = hashcode
 		self.date = hashcode[:8]
 		self.hosted = True
 		if hashcode[8] == 'N': self.hosted = False
 		self.teams = {'hm': hm, hm.name: hm, 'vs': vs, vs.name: vs}
-		self.plays = []
+	# END _set_header
+	
+	@classmethod
+	def from_play_store(cls, store, i, hm, vs):
+		'''Make a Game backed by a PlayStore
 		
-		csv_lns = re.findall(r'[^\n]+?\n', pbp_csv)
-		if len(csv_lns) < 2:
-			raise EmptyGameError(hashcode, hm.name, vs.name)
+		Args:
+			store (PlayStore): columnar store of the game's season
+			i (int): position of the game in the store
+			hm (Team): home team
+			vs (Team): visiting team
+		Returns:
+			Game.
+		'''
+		gm = cls.__new__(cls)
+		gm._set_header(str(store.gm_hcs[i]), hm, vs)
+		gm.plays_keys = list(PlayStore.plays_keys)
+		gm._plays = None
+		gm._ptypes = None
+		gm._store = store
+		gm._store_i = i
+		return gm
+	# END from_play_store
+	
+	@property
+	def plays(self):
+		if self._plays is None:
+			self._plays = self._store.game_plays(self._store_i, self.hm, self.vs)
 		# END if
-		
-		self.plays_keys = ampLib.csvline_to_list(csv_lns.pop(0))
-		# pbpKeys = [period, time, vs_sc, hm_sc, team, play]
-		for ln in csv_lns:
-			ln = ampLib.csvline_to_list(ln)
-			self.plays.append(
-				(
-					int(ln[0]), ln[1], int(ln[2]), int(ln[3]),
-					self.teams[ln[4]], ln[5]
-				)
-			)
-		# END for
-	# END __init__
+		return self._plays
+	# END plays
+	
+	@property
+	def ptypes(self):
+		# plays are classified once, on first use
+		if self._ptypes is None:
+			if hasattr(self, '_store'):
+				i = self._store_i
+				self._ptypes = self._store.ptype[
+					self._store.gm_start[i]:self._store.gm_start[i+1]
+				].tolist()
+			else:
+				self._ptypes = [classify_play(ply[5]) for ply in self._plays]
+			# END if
+		# END if
+		return self._ptypes
+	# END ptypes
 	
 	@property
 	def hm(self): return self.teams['hm']
@@ -211,41 +627,35 @@ class Game(object):
 		#     0:period (int), 1:time (str), 2:vs_sc (int), 3:hm_sc (int),
 		#     4:team (Team), 5:play (str)
 		# ]
-		for ply in self.plays:
+		for (ply, ptype) in zip(self.plays, self.ptypes):
 			prevTime = time
-			
 			time = ply[1]
-			curr_play_desc = ply[5].lower()
 			
-			skipMat = re.search(
-				'enters|leaves|timeout|deadball', curr_play_desc
-			)
-			if skipMat:
+			if ptype == PLAY_SKIP:
 				continue
-			elif re.search('turnover', curr_play_desc):
+			elif ptype == PLAY_TURNOVER:
 				if len(curr_bout) > 0: yield curr_bout
 				
-				curr_bout = Bout(ply)
-			elif ( re.search(r'made|missed', curr_play_desc)
-			and not re.search(r'free throw', curr_play_desc) ):
+				curr_bout = Bout(ply, ptype)
+			elif ptype == PLAY_FGA:
 				if len(curr_bout) > 0: yield curr_bout
 				
-				curr_bout = Bout(ply, fga=True)
-			elif re.search(r'foul', curr_play_desc):
+				curr_bout = Bout(ply, ptype)
+			elif ptype == PLAY_FOUL:
 				if curr_bout.first_act_fga and time == prevTime:
-					curr_bout.append(ply)
+					curr_bout.append(ply, ptype)
 					continue
 				# END if
 				
 				if len(curr_bout) > 0: yield curr_bout
 				
-				curr_bout = Bout(ply)
-			elif re.search(r'end of', curr_play_desc):
+				curr_bout = Bout(ply, ptype)
+			elif ptype == PLAY_END:
 				if len(curr_bout) > 0: yield curr_bout
 				
 				curr_bout = Bout()
 			else:
-				curr_bout.append(ply)
+				curr_bout.append(ply, ptype)
 			# END if
 		# END for
 	# END __iter__
@@ -259,27 +669,45 @@ class Game(object):
 class Bout(object):
 	'''Basketball Possession Bout Class
 	
-	The Bout class will describe a single run through the possession tree
+	The Bout class will describe a single run through the possession tree.
+	Its flags are set as plays are appended and its string is only compiled
+	when first asked for.
 	
 	Instantiation Args:
-		plays (list)
+		ply = None (tuple): first play of the bout
+		ptype = None (int): play type code of ply, see classify_play, found
+			from the play's description if not given
+		fga = None (bool): if given, whether ply is a field goal attempt
+			(PLAY_FGA), as an alternative to ptype
 	Instance Attributes:
 		compiled_string (str)
-		first_act_fga (bool)
+		first_act_fga (bool): None for a bout without plays
 		plays (list)
 		includes_commonfoul (bool)
+		includes_fga (bool)
+		includes_ft (bool)
+		includes_turnover (bool)
 	Class Methods:
 		__len__
 		__str__
 		append
 	'''
 	
-	def __init__(self, ply=None, fga=False):
-		self.first_act_fga = None
-		self.compiled_string = ''
+	__slots__ = (
+		'plays', 'first_act_fga', 'includes_fga', 'includes_ft',
+		'includes_turnover', '_foul', '_free_throw', '_string'
+	)
+	
+	def __init__(self, ply=None, ptype=None, fga=None):
 		self.plays = []
-		if ply is not None: self.append(ply, fga)
-		# END if
+		self.first_act_fga = None
+		self.includes_fga = False
+		self.includes_ft = False
+		self.includes_turnover = False
+		self._foul = False
+		self._free_throw = False
+		self._string = None
+		if ply is not None: self.append(ply, ptype, fga)
 	# END __init__
 	
 	def __len__(self):
@@ -287,118 +715,1240 @@ class Bout(object):
 	# END __len__
 	
 	def __str__(self):
-		return self.compiled_string
+		if self._string is None:
+			self._string = ''.join(
+				'{0},{1},{2:02d},{3:02d},{4},{5};'.format(*ply)
+				for ply in self.plays
+			)
+		# END if
+		return self._string
 	# END __str__
 	
-	def append(self, ply, fga=False):
+	@property
+	def compiled_string(self): return str(self)
+	
+	def append(self, ply, ptype=None, fga=None):
+		if ptype is None:
+			ptype = classify_play(ply[5])
+		elif (
+			isinstance(ptype, bool) or
+			not isinstance(ptype, (int, long, np.integer))
+		):
+			# Bout(ply, True) was once Bout(ply, fga=True)
+			raise TypeError(
+				'ptype must be a play type code, not {0!r}'.format(ptype)
+			)
+		# END if
+		if fga is not None:
+			if fga:
+				ptype = PLAY_FGA
+			elif ptype == PLAY_FGA:
+				ptype = PLAY_OTHER
+			# END if
+		# END if
 		self.plays.append(ply)
-		if len(self) == 1: self.first_act_fga = fga
-		self.compiled_string += '{0},{1},{2:02d},{3:02d},{4},{5};'.format(*ply)
+		self._string = None
+		if len(self.plays) == 1: self.first_act_fga = (ptype == PLAY_FGA)
+		if ptype == PLAY_FGA:
+			self.includes_fga = True
+		elif ptype == PLAY_FT:
+			self.includes_ft = True
+		elif ptype == PLAY_TURNOVER:
+			self.includes_turnover = True
+		# END if
+		
+		# same (case-sensitive) matches as searching the compiled string
+		tm_nm = str(ply[4])
+		if 'foul' in ply[5] or 'foul' in tm_nm: self._foul = True
+		if 'free throw' in ply[5] or 'free throw' in tm_nm:
+			self._free_throw = True
+		# END if
 	# END append
 	
 	@property
 	def includes_commonfoul(self):
-		if ( re.search(r'foul', str(self))
-		and not re.search(r'free throw', str(self)) ):
-			return True
-		else:
-			return False
-		# END if
+		return self._foul and not self._free_throw
 	# END includes_commonfoul
 # END Bout
 
 #===============================================================================
-class EmptyGameError(Exception):
-	'''Empty Game Error Exception Class
+class PlayStore(object):
+	'''Columnar Play Store Class
 	
-	Exception raised for attempt to create a Game object without PbP data
+	Memory-mapped, column-oriented copy of a season's pbp-xml database, as
+	written by build_play_store into the directory "plays_<season>".  Each
+	column is a .npy file loaded as a numpy.memmap.  The play columns hold one
+	entry per play with every game's plays in one contiguous slice, starting
+	at gm_start[i] and ending at gm_start[i+1].  Play descriptions and team
+	names are dictionary encoded, with the dictionaries in "descs.txt" and
+	"teams.txt".
 	
 	Instantiation Args:
-		gmHashcode (str): Hashcode of game
-		hmtm (str): Name of home team.
-		vstm (str): Name of visiting team.
+		arg (str|core.League|core.SeasonName): season, as for SeasonData
 	Instance Attributes:
-		gmHashcode (str)
-		hmtm (str)
-		vstm (str)
-		msg (str)
+		dir_name (str)
+		gm_hcs (numpy.memmap): game hashcodes
+		gm_start (numpy.memmap): index of each game's first play, followed by
+			the total number of plays
+		hm (numpy.memmap): home team name code of each game
+		vs (numpy.memmap): visiting team name code of each game
+		period (numpy.memmap)
+		clock (numpy.memmap): seconds left on the clock, -1 if unreadable
+		vs_sc (numpy.memmap)
+		hm_sc (numpy.memmap)
+		side (numpy.memmap): 1 for home team, 2 for visitor, 0 for neither
+		ptype (numpy.memmap): play type code, see classify_play
+		desc (numpy.memmap): play description code
+		descs (list): play descriptions (str)
+		tm_nms (list): team names (str)
+	Class Methods:
+		game_plays
 	'''
-	def __init__(self, gmHashcode, hmtm='', vstm=''):
-		self.gmHashcode = gmHashcode
-		self.hmtm = hmtm
-		self.vstm = vstm
-	# END __init__
 	
-	def __str__(self):
-		self.msg = 'No PbP data in ' + self.gmHashcode
-		if self.hmtm != '' and self.vstm != '':
-			self.msg += ', {} vs. {}'.format(self.vstm, self.hmtm)
-		return repr(self.msg)
-	# END __str__
-# END EmptyGameError
-
-# TODO: make a method of Game class
-#===============================================================================
-#  (P[hm win], finalScore) = predictGm(Vhm, Vvs, ('H'|'N'), ('M'|'W'))
-#-------------------------------------------------------------------------------
-
-# TODO: make a method of Game class
-#===============================================================================
-#  {'V2H':, 'H2V':} = valueGm(scDiff, ('H'|'N'), ('M'|'W'))
-#-------------------------------------------------------------------------------
-def valueGm(scDiff, HorN, MorW):
-	'''Game valuing function
-	
-	Here's the idea.  If, for example, a team wins by 16 at home then this
-	performance is better than 68.5% (or 1 stdev) of all other game outcomes.
-	Therefore, the random walker voter will judge this team as
-	the better team 68.5% of the time.  Or, 68.5% of RW voters will pick that
-	team as better.
-	'''
-	if MorW.lower() == 'm':
-		# Home edge
-		mu = 4.45703
-		# Standard deviation in score
-		sig = 12.75732
-	else:
-		mu = 3.94315
-		sig = 16.36411
+	gm_columns = [
+		('gm_hcs', 'S16'), ('gm_start', 'int64'), ('hm', 'int32'),
+		('vs', 'int32')
+	]
+	play_columns = [
+		('period', 'int8'), ('clock', 'int16'), ('vs_sc', 'int16'),
+		('hm_sc', 'int16'), ('side', 'int8'), ('ptype', 'int8'),
+		('desc', 'int32')
+	]
+	plays_keys = ['period', 'time', 'vs_score', 'hm_score', 'team', 'play']
 	
-	if HorN.lower() == 'h':
-		adjScDiff = scDiff - mu
-	else:
-		adjScDiff = scDiff
+	def __init__(self, arg):
+		sn = _parse_season_arg(arg, load_league=False)[0]
+		self.dir_name = 'plays_{0}'.format(sn)
+		
+		for (col, dtype) in self.gm_columns + self.play_columns:
+			path = os.path.join(self.dir_name, col + '.npy')
+			try:
+				setattr(self, col, np.load(path, mmap_mode='r'))
+			except ValueError:
+				# numpy will not memory-map an empty array
+				setattr(self, col, np.load(path))
+			# END try
+		# END for
+		
+		with open(os.path.join(self.dir_name, 'descs.txt')) as f:
+			self.descs = f.read().split('\n')
+		with open(os.path.join(self.dir_name, 'teams.txt')) as f:
+			self.tm_nms = f.read().split('\n')
+	# END __init__
 	
-	p = {'V2H': 0.0, 'H2V': 0.0}
-	p['V2H'] = 0.5*(1.0 + erf( adjScDiff / (sqrt(2.0)*sig) ))
-	p['H2V'] = 1.0 - p['V2H']
+	def __len__(self):
+		return len(self.gm_hcs)
+	# END __len__
 	
-	return p
-# END valueGm
+	def game_plays(self, i, hm, vs):
+		'''Build the list of plays of one game, as in Game.plays
+		
+		Args:
+			i (int): position of the game in the store
+			hm (Team): home team
+			vs (Team): visiting team
+		Returns:
+			list.  [(period, time, vs_sc, hm_sc, team, play), ...]
+		'''
+		a = int(self.gm_start[i])
+		b = int(self.gm_start[i+1])
+		sides = (None, hm, vs)
+		
+		plays = []
+		for (per, clk, vs_sc, hm_sc, sd, dc) in zip(
+			self.period[a:b].tolist(), self.clock[a:b].tolist(),
+			self.vs_sc[a:b].tolist(), self.hm_sc[a:b].tolist(),
+			self.side[a:b].tolist(), self.desc[a:b].tolist()
+		):
+			if clk < 0:
+				time = ''
+			else:
+				time = '{0:02d}:{1:02d}'.format(clk/60, clk%60)
+			# END if
+			plays.append(
+				(per, time, vs_sc, hm_sc, sides[sd], self.descs[dc])
+			)
+		# END for
+		
+		return plays
+	# END game_plays
+# END PlayStore
 
-# TODO: make a method of SeasonData class
 #===============================================================================
-def rwRank(dataInput, MorW='M'):
-	'''Random-Walker Ranking Function
+class GameLog(object):
+	'''Array-Backed Game Log Class
+	
+	Append-only log of game results kept in typed arrays, one column per
+	field, for replaying games through an EloRater
+	
+	Instantiation Args: -none-
+	Alternate Constructors:
+		from_games
+		from_played_games
+		load
+	Instance Attributes:
+		gm_hcs (list): game hashcodes (str)
+		tm_nms (list): team names (str), teams are numbered by position
+		tm_ids (dict): team numbers keyed by name
+	Class Methods:
+		__len__
+		append
+		columns
+		save
 	'''
-	if type(dataInput).__name__ == 'str':
-		# Read in game data
-		boxData = ampLib.csv2LD(dataInput)
-		#  expect file name to be "box_data_(M|W)_10-11.csv"
-		MorW = re.search(r'(?<=_)M|W(?=_)', dataInput).group(0)
-	else:
-		boxData = dataInput
 	
-	for gmEntry in boxData:
-		gmEntry['hmSc'] = int(gmEntry['hmSc'])
-		gmEntry['vsSc'] = int(gmEntry['vsSc'])
+	def __init__(self):
+		self.gm_hcs = []
+		self.tm_nms = []
+		self.tm_ids = {}
+		self._cols = {
+			'date': array.array('i'), 'hm': array.array('i'),
+			'vs': array.array('i'), 'hosted': array.array('b'),
+			'sc_diff': array.array('i')
+		}
+	# END __init__
 	
-	# Set-up team legend
-	tmIds = core.League('team_ids_' + MorW + '1011.csv')
-	allTms = tmIds.names
-	nonD1tm = tmIds.non_D1_name
+	@classmethod
+	def from_games(cls, gms):
+		'''Log Game objects, e.g. from a SeasonData or iter_games, with final
+		scores taken from each game's last play
+		'''
+		log = cls()
+		for gm in gms:
+			lastPly = gm.plays[-1]
+			log.append(gm.hc, gm.hm.name, gm.vs.name, lastPly[3], lastPly[2])
+		# END for
+		return log
+	# END from_games
 	
-	#DEBUG: Example League
+	@classmethod
+	def from_played_games(cls, played_gms):
+		'''Log games as listed by collection.download_gm_links
+		
+		Args:
+			played_gms (list|core.SeasonName|core.League): the list of
+				(gmhc, vsTm, vsSc, hmTm, hmSc, gm_link), or a season whose
+				"played_games_<season>.csv" file to read
+		Returns:
+			GameLog.
+		'''
+		log = cls()
+		if type(played_gms) is list:
+			for (gmhc, vsTm, vsSc, hmTm, hmSc, gm_link) in played_gms:
+				log.append(gmhc, str(hmTm), str(vsTm), hmSc, vsSc)
+			# END for
+		else:
+			sn = _parse_season_arg(played_gms, load_league=False)[0]
+			for (gmhc, vsTm, vsSc, hmTm, hmSc) in ampLib.iter_csv(
+				'played_games_{0}.csv'.format(sn),
+				core.CSV_SCHEMAS['played_games'][:5]
+			):
+				log.append(gmhc, hmTm, vsTm, hmSc, vsSc)
+			# END for
+		# END if
+		return log
+	# END from_played_games
+	
+	@classmethod
+	def load(cls, file_name):
+		'''Read a GameLog written by GameLog.save
+		'''
+		log = cls()
+		data = np.load(file_name)
+		log.gm_hcs = data['gm_hcs'].tolist()
+		log.tm_nms = data['tm_nms'].tolist()
+		log.tm_ids = dict( (tm, i) for (i, tm) in enumerate(log.tm_nms) )
+		for (col, vals) in log._cols.items():
+			vals.extend( data[col].tolist() )
+		# END for
+		return log
+	# END load
+	
+	def __len__(self):
+		return len(self.gm_hcs)
+	# END __len__
+	
+	def _tm_id(self, tm):
+		if tm not in self.tm_ids:
+			self.tm_ids[tm] = len(self.tm_nms)
+			self.tm_nms.append(tm)
+		# END if
+		return self.tm_ids[tm]
+	# END _tm_id
+	
+	def _arrays(self):
+		# numpy will not view an empty buffer
+		return dict(
+			(col, np.array(vals, dtype=vals.typecode))
+			for (col, vals) in self._cols.items()
+		)
+	# END _arrays
+	
+	def append(self, gmhc, hm_nm, vs_nm, hmSc, vsSc):
+		'''Add a game's result to the log
+		
+		Args:
+			gmhc (str): game hashcode
+			hm_nm (str): home team name
+			vs_nm (str): visiting team name
+			hmSc (int|str): home team's final score
+			vsSc (int|str): visiting team's final score
+		Returns: None
+		'''
+		self.gm_hcs.append(gmhc)
+		self._cols['date'].append( int(gmhc[:8]) )
+		self._cols['hm'].append( self._tm_id(hm_nm) )
+		self._cols['vs'].append( self._tm_id(vs_nm) )
+		self._cols['hosted'].append(gmhc[8] != 'N')
+		self._cols['sc_diff'].append( int(hmSc) - int(vsSc) )
+	# END append
+	
+	def columns(self, start=None, end=None):
+		'''Get the log's columns as numpy arrays, in date order
+		
+		Args:
+			start = None (int): earliest game date to include, as yyyymmdd
+			end = None (int): latest game date to include, as yyyymmdd
+		Returns:
+			dict.  {'date':, 'hm':, 'vs':, 'hosted':, 'sc_diff':} of arrays,
+				plus 'i', the games' positions in the log
+		'''
+		cols = self._arrays()
+		cols['hosted'] = cols['hosted'].astype(bool)
+		
+		inRange = np.ones(len(self), dtype=bool)
+		if start is not None: inRange &= cols['date'] >= start
+		if end is not None: inRange &= cols['date'] <= end
+		# a stable sort keeps same-day games in the order they were logged
+		iGms = np.flatnonzero(inRange)
+		iGms = iGms[np.argsort(cols['date'][iGms], kind='mergesort')]
+		
+		cols = dict( (col, vals[iGms]) for (col, vals) in cols.items() )
+		cols['i'] = iGms
+		return cols
+	# END columns
+	
+	def save(self, file_name):
+		'''Write the log to a numpy .npz file
+		'''
+		np.savez(
+			file_name, gm_hcs=np.array(self.gm_hcs, dtype=str),
+			tm_nms=np.array(self.tm_nms, dtype=str), **self._arrays()
+		)
+	# END save
+# END GameLog
+
+#===============================================================================
+class EloRater(object):
+	'''Online Elo-Style Rating Class
+	
+	Rates teams in points, updating the two teams' ratings after each game.
+	The expected score of a game is the valueGm probability that the home
+	team is the better team given a score difference equal to the
+	difference in the teams' ratings.  The actual score is valueGm's value of
+	the final score difference.  After each game the home team gains k times
+	the actual score minus the expected score, and the visitor loses the
+	same amount.
+	
+	Instantiation Args:
+		MorW = 'M' (str): gender, for valueGm's parameters
+		k = 8.0 (float): points moved by a completely unexpected result
+		init = 0.0 (float): rating of a team's first game
+	Alternate Constructors:
+		load
+	Instance Attributes:
+		MorW (str)
+		k (float)
+		init (float)
+		ratings (dict): ratings (float) keyed by team name
+		n_gms (int): number of games rated
+		last_date (int): date of the latest game rated, as yyyymmdd
+	Class Methods:
+		expected
+		rankings
+		replay
+		save
+		update
+	'''
+	
+	def __init__(self, MorW='M', k=8.0, init=0.0):
+		self.MorW = MorW
+		self.k = k
+		self.init = init
+		self.ratings = {}
+		self.n_gms = 0
+		self.last_date = 0
+		(self._mu, sig) = _score_params(MorW)
+		self._scale = 1.0 / (sqrt(2.0)*sig)
+	# END __init__
+	
+	@classmethod
+	def load(cls, file_name):
+		'''Read an EloRater checkpoint written by EloRater.save
+		'''
+		data = np.load(file_name)
+		elo = cls(str(data['MorW']), float(data['k']), float(data['init']))
+		elo.ratings = dict(
+			zip(data['tm_nms'].tolist(), data['ratings'].tolist())
+		)
+		elo.n_gms = int(data['n_gms'])
+		elo.last_date = int(data['last_date'])
+		return elo
+	# END load
+	
+	def save(self, file_name):
+		'''Checkpoint the rater's state to a numpy .npz file
+		'''
+		tm_nms = sorted(self.ratings)
+		np.savez(
+			file_name, MorW=self.MorW, k=self.k, init=self.init,
+			n_gms=self.n_gms, last_date=self.last_date,
+			tm_nms=np.array(tm_nms, dtype=str),
+			ratings=np.array([self.ratings[tm] for tm in tm_nms])
+		)
+	# END save
+	
+	def expected(self, hm_nm, vs_nm):
+		'''Expected score of the home team against the visitor
+		'''
+		dR = self.ratings.get(hm_nm, self.init) - self.ratings.get(
+			vs_nm, self.init
+		)
+		return 0.5*(1.0 + erf(dR*self._scale))
+	# END expected
+	
+	def update(self, gmhc, hm_nm, vs_nm, hmSc, vsSc):
+		'''Rate one game
+		
+		Args:
+			gmhc (str): game hashcode
+			hm_nm (str): home team name
+			vs_nm (str): visiting team name
+			hmSc (int|str): home team's final score
+			vsSc (int|str): visiting team's final score
+		Returns:
+			float.  Points gained by the home team
+		'''
+		scDiff = int(hmSc) - int(vsSc)
+		if gmhc[8] != 'N': scDiff -= self._mu
+		actual = 0.5*(1.0 + erf(scDiff*self._scale))
+		
+		dR = self.k * (actual - self.expected(hm_nm, vs_nm))
+		self.ratings[hm_nm] = self.ratings.get(hm_nm, self.init) + dR
+		self.ratings[vs_nm] = self.ratings.get(vs_nm, self.init) - dR
+		self.n_gms += 1
+		self.last_date = max(self.last_date, int(gmhc[:8]))
+		
+		return dR
+	# END update
+	
+	def replay(self, log, start=None, end=None):
+		'''Rate the games of a GameLog in date order
+		
+		The actual scores of all the games are found in one valueGms call,
+		leaving only the rating updates in the loop over games.
+		
+		Args:
+			log (GameLog): games to rate
+			start = None (int): earliest game date to rate, as yyyymmdd
+			end = None (int): latest game date to rate, as yyyymmdd
+		Returns:
+			int.  Number of games rated
+		'''
+		cols = log.columns(start, end)
+		if len(cols['i']) == 0: return 0
+		actuals = valueGms(cols['sc_diff'], cols['hosted'], self.MorW)[0]
+		
+		R = [self.ratings.get(tm, self.init) for tm in log.tm_nms]
+		k = self.k
+		scale = self._scale
+		for (hm, vs, actual) in zip(
+			cols['hm'].tolist(), cols['vs'].tolist(), actuals.tolist()
+		):
+			dR = k * (actual - 0.5*(1.0 + erf((R[hm] - R[vs])*scale)))
+			R[hm] += dR
+			R[vs] -= dR
+		# END for
+		
+		played = np.zeros(len(log.tm_nms), dtype=bool)
+		played[cols['hm']] = True
+		played[cols['vs']] = True
+		for i in np.flatnonzero(played):
+			self.ratings[log.tm_nms[i]] = R[i]
+		# END for
+		self.n_gms += len(cols['i'])
+		self.last_date = max(self.last_date, int(cols['date'][-1]))
+		
+		return len(cols['i'])
+	# END replay
+	
+	def rankings(self):
+		'''Teams sorted by rating
+		
+		Returns:
+			list.  [(rank, team_name, rating), ...]
+		'''
+		tms = sorted(self.ratings, key=lambda tm: self.ratings[tm], reverse=True)
+		return [(i+1, tm, self.ratings[tm]) for (i, tm) in enumerate(tms)]
+	# END rankings
+# END EloRater
+
+#===============================================================================
+class EmptyGameError(Exception):
+	'''Empty Game Error Exception Class
+	
+	Exception raised for attempt to create a Game object without PbP data
+	
+	Instantiation Args:
+		gmHashcode (str): Hashcode of game
+		hmtm (str): Name of home team.
+		vstm (str): Name of visiting team.
+	Instance Attributes:
+		gmHashcode (str)
+		hmtm (str)
+		vstm (str)
+		msg (str)
+	'''
+	def __init__(self, gmHashcode, hmtm='', vstm=''):
+		self.gmHashcode = gmHashcode
+		self.hmtm = hmtm
+		self.vstm = vstm
+	# END __init__
+	
+	def __str__(self):
+		self.msg = 'No PbP data in ' + self.gmHashcode
+		if self.hmtm != '' and self.vstm != '':
+			self.msg += ', {} vs. {}'.format(self.vstm, self.hmtm)
+		return repr(self.msg)
+	# END __str__
+# END EmptyGameError
+
+#===============================================================================
+def _parse_season_arg(arg, load_league=True):
+	'''Turn a pbp-xml file name, core.League, or core.SeasonName into a
+	(core.SeasonName, core.League) pair
+	'''
+	if type(arg) is str:
+		try:
+			gy = re.search(
+				r'^pbp_data_(M|W)_(\d\d)-\d\d\.xml$', arg
+			).groups()
+		except Exception as err:
+			raise type(err)('file name, "{0}", not vaild'.format(arg))
+		# END try
+		sn = core.SeasonName(gy[0], '20'+gy[1])
+		leag = None
+	elif type(arg) is core.League:
+		leag = arg
+		sn = leag.sn
+	elif type(arg) is core.SeasonName:
+		sn = arg
+		leag = None
+	else:
+		raise TypeError(
+			'SeasonData initalization argument must be ' +
+			'a file name (str), a core.League, or a core.SeasonName'
+		)
+	# END if
+	
+	if leag is None and load_league: leag = core.League(sn)
+	
+	return sn, leag
+# END _parse_season_arg
+
+#===============================================================================
+def _iter_entry_blocks(lines):
+	'''Split lines of the pbp-xml database into game entries in one pass
+	
+	Yields (gmhc, hm_nm, vs_nm, csv_lns) for every game entry, csv_lns being
+	the list of the entry's non-blank csv lines
+	'''
+	csv_lns = []
+	for ln in lines:
+		if ln[0] != '<':
+			if ln != '\n': csv_lns.append(ln)
+		elif ln[1] == 'g':
+			gmhc = ln[10:ln.index('"', 10)]
+		elif ln[1] == 'h':
+			hm_nm = ln[6:ln.index('<', 6)]
+		elif ln[1] == 'v':
+			vs_nm = ln[9:ln.index('<', 9)]
+		elif ln == '</game>\n':
+			yield (gmhc, hm_nm, vs_nm, csv_lns)
+			csv_lns = []
+		# END if
+	# END for
+# END _iter_entry_blocks
+
+#===============================================================================
+def _parse_pbp_csv(csv_lns):
+	'''Parse the csv block of a game entry
+	
+	Takes the block as a list of lines, or as a str in which case only
+	newline-terminated, non-blank lines count.  Returns (plays_keys, rows) with
+	rows of (period, time, vs_sc, hm_sc, team_name, play), or None if the
+	block has no plays.  Rows are read by ampLib.iter_csv.
+	'''
+	if isinstance(csv_lns, basestring):
+		csv_lns = csv_lns.split('\n')
+		csv_lns.pop()
+		csv_lns = [ln for ln in csv_lns if ln]
+	# END if
+	if len(csv_lns) < 2: return None
+	
+	schema = core.CSV_SCHEMAS['pbp']
+	plays_keys = [nm for (nm, typ) in schema]
+	rows = list( ampLib.iter_csv(csv_lns, schema) )
+	
+	return plays_keys, rows
+# END _parse_pbp_csv
+
+#===============================================================================
+def _parse_entries(lines, leag):
+	'''Parse lines of the pbp-xml database into Game objects
+	
+	Yields (gmhc, Game) for every game entry, with the EmptyGameError in place
+	of the Game for games without pbp data
+	'''
+	for (gmhc, hm_nm, vs_nm, csv_lns) in _iter_entry_blocks(lines):
+		try:
+			hm = leag(hm_nm)
+			vs = leag(vs_nm)
+			yield (gmhc, Game(gmhc, hm, vs, csv_lns))
+		except EmptyGameError as err:
+			yield (gmhc, err)
+		# END try
+	# END for
+# END _parse_entries
+
+#===============================================================================
+def _load_chunk(file_name, start, stop):
+	'''Process pool worker for SeasonData's parallel loading
+	
+	Parses the game entries between two byte offsets of a pbp-xml database.
+	Returns a list of (gmhc, hm_nm, vs_nm, plays_keys, plays) with the team of
+	every play given as a side code (see Game.from_plays), and plays_keys and
+	plays set to None for empty games.
+	'''
+	with open(file_name, 'rb') as f:
+		f.seek(start)
+		lines = f.read(stop - start).splitlines(True)
+	# END with
+	
+	results = []
+	for (gmhc, hm_nm, vs_nm, csv_lns) in _iter_entry_blocks(lines):
+		parsed = _parse_pbp_csv(csv_lns)
+		if parsed is None:
+			results.append( (gmhc, hm_nm, vs_nm, None, None) )
+			continue
+		# END if
+		
+		plays_keys, rows = parsed
+		sides = {hm_nm: 1, vs_nm: 2}
+		plays = [
+			(per, time, vs_sc, hm_sc, sides.get(tm_nm, 0), desc)
+			for (per, time, vs_sc, hm_sc, tm_nm, desc) in rows
+		]
+		results.append( (gmhc, hm_nm, vs_nm, plays_keys, plays) )
+	# END for
+	
+	return results
+# END _load_chunk
+
+#===============================================================================
+def load_seasons(args, procs=None):
+	'''Load several seasons' SeasonData using one shared process pool
+	
+	Args:
+		args (list): seasons, each as for SeasonData
+		procs = None (int): number of processes, defaults to the number of CPUs
+	Returns:
+		list.  [SeasonData, ...]
+	'''
+	pool = mp.Pool(procs)
+	try:
+		return [SeasonData(arg, procs=pool) for arg in args]
+	finally:
+		pool.close()
+		pool.join()
+	# END try
+# END load_seasons
+
+#===============================================================================
+def iter_games(args, start=None, end=None, tms=None, gm_hcs=None):
+	'''Stream Game objects one at a time out of pbp-xml databases
+	
+	Only the game being yielded is held in memory, so any number of seasons
+	can be run through in one pass.  Entries are filtered on their header
+	before their play-by-play is parsed, and empty games are skipped.
+	
+	Args:
+		args (list): seasons, each as for SeasonData, or a single season
+		start = None (int): earliest game date to yield, as yyyymmdd
+		end = None (int): latest game date to yield, as yyyymmdd
+		tms = None (list): only yield games in which one of these teams
+			(Team|str) played
+		gm_hcs = None (list): hashcodes of the only games to yield, these are
+			read through each database's core.PbpIndex without scanning it
+	Yields:
+		Game
+	'''
+	if type(args) not in (list, tuple): args = [args]
+	if tms is not None:
+		tm_nms = set(tm if type(tm) is str else tm.name for tm in tms)
+	# END if
+	
+	for arg in args:
+		sn, leag = _parse_season_arg(arg)
+		file_name = 'pbp_data_{0}.xml'.format(sn)
+		pbp_index = None
+		if gm_hcs is None:
+			f = open(file_name)
+			lines = f
+		else:
+			f = None
+			pbp_index = core.PbpIndex(file_name, leag)
+			lines = (
+				ln for (gmhc, entry) in pbp_index.read_entries(
+					[gmhc for gmhc in gm_hcs if gmhc in pbp_index]
+				)
+				for ln in entry.splitlines(True)
+			)
+		# END if
+		
+		try:
+			for (gmhc, hm_nm, vs_nm, csv_lns) in _iter_entry_blocks(lines):
+				if start is not None and int(gmhc[:8]) < start: continue
+				if end is not None and int(gmhc[:8]) > end: continue
+				if (
+					tms is not None and
+					hm_nm not in tm_nms and vs_nm not in tm_nms
+				):
+					continue
+				# END if
+				
+				try:
+					yield Game(gmhc, leag(hm_nm), leag(vs_nm), csv_lns)
+				except EmptyGameError:
+					pass
+				# END try
+			# END for
+		finally:
+			if f is not None: f.close()
+			if pbp_index is not None: pbp_index.close()
+		# END try
+	# END for
+# END iter_games
+
+#===============================================================================
+_skip_ptn = re.compile('enters|leaves|timeout|deadball')
+_turnover_ptn = re.compile('turnover')
+_fga_ptn = re.compile(r'made|missed')
+_ft_ptn = re.compile(r'free throw')
+_foul_ptn = re.compile(r'foul')
+_end_ptn = re.compile(r'end of')
+
+def classify_play(desc):
+	'''Play Type Classifier
+	
+	Sorts a play description into the categories used to split a game into
+	bouts, with the same precedence as Game.__iter__
+	
+	Args:
+		desc (str): play description
+	Returns:
+		int.  PLAY_SKIP, PLAY_TURNOVER, PLAY_FGA, PLAY_FOUL, PLAY_END,
+			PLAY_FT (free throws) or PLAY_OTHER
+	'''
+	desc = desc.lower()
+	if _skip_ptn.search(desc):
+		return PLAY_SKIP
+	elif _turnover_ptn.search(desc):
+		return PLAY_TURNOVER
+	elif _ft_ptn.search(desc):
+		if _foul_ptn.search(desc): return PLAY_FOUL
+		if _end_ptn.search(desc): return PLAY_END
+		return PLAY_FT
+	elif _fga_ptn.search(desc):
+		return PLAY_FGA
+	elif _foul_ptn.search(desc):
+		return PLAY_FOUL
+	elif _end_ptn.search(desc):
+		return PLAY_END
+	else:
+		return PLAY_OTHER
+	# END if
+# END classify_play
+
+#===============================================================================
+def build_play_store(arg):
+	'''Convert a season's pbp-xml database into a columnar PlayStore
+	
+	Args:
+		arg (str|core.League|core.SeasonName): season, as for SeasonData
+	Returns:
+		PlayStore.
+	'''
+	sn = _parse_season_arg(arg, load_league=False)[0]
+	dir_name = 'plays_{0}'.format(sn)
+	if not os.path.isdir(dir_name): os.makedirs(dir_name)
+	
+	gm_cols = {'gm_hcs': [], 'gm_start': [0], 'hm': [], 'vs': []}
+	play_cols = {
+		'period': array.array('b'), 'clock': array.array('h'),
+		'vs_sc': array.array('h'), 'hm_sc': array.array('h'),
+		'side': array.array('b'), 'ptype': array.array('b'),
+		'desc': array.array('i')
+	}
+	descs = {}
+	tm_nms = {}
+	def code(lut, key):
+		if key not in lut: lut[key] = len(lut)
+		return lut[key]
+	# END code
+	
+	clock_ptn = re.compile(r'^\s*(\d+):(\d\d)')
+	with open('pbp_data_{0}.xml'.format(sn)) as f:
+		for (gmhc, hm_nm, vs_nm, csv_lns) in _iter_entry_blocks(f):
+			parsed = _parse_pbp_csv(csv_lns)
+			if parsed is None: parsed = ([], [])
+			for (per, time, vs_sc, hm_sc, tm_nm, play) in parsed[1]:
+				play_cols['period'].append(per)
+				clk_mat = clock_ptn.match(time)
+				if clk_mat:
+					play_cols['clock'].append(
+						60*int(clk_mat.group(1)) + int(clk_mat.group(2))
+					)
+				else:
+					play_cols['clock'].append(-1)
+				# END if
+				play_cols['vs_sc'].append(vs_sc)
+				play_cols['hm_sc'].append(hm_sc)
+				if tm_nm == hm_nm:
+					play_cols['side'].append(1)
+				elif tm_nm == vs_nm:
+					play_cols['side'].append(2)
+				else:
+					play_cols['side'].append(0)
+				# END if
+				play_cols['ptype'].append( classify_play(play) )
+				play_cols['desc'].append( code(descs, play) )
+			# END for
+			
+			gm_cols['gm_hcs'].append(gmhc)
+			gm_cols['gm_start'].append( len(play_cols['period']) )
+			gm_cols['hm'].append( code(tm_nms, hm_nm) )
+			gm_cols['vs'].append( code(tm_nms, vs_nm) )
+		# END for
+	# END with
+	
+	for (col, dtype) in PlayStore.gm_columns:
+		np.save(
+			os.path.join(dir_name, col + '.npy'),
+			np.array(gm_cols[col], dtype=dtype)
+		)
+	# END for
+	for (col, dtype) in PlayStore.play_columns:
+		if len(play_cols[col]) > 0:
+			col_arr = np.frombuffer(play_cols[col], dtype=dtype)
+		else:
+			col_arr = np.zeros(0, dtype=dtype)
+		# END if
+		np.save(os.path.join(dir_name, col + '.npy'), col_arr)
+	# END for
+	
+	for (file_name, lut) in [('descs.txt', descs), ('teams.txt', tm_nms)]:
+		keys = sorted(lut, key=lut.get)
+		with open(os.path.join(dir_name, file_name), 'w') as f:
+			f.write( '\n'.join(keys) )
+		# END with
+	# END for
+	
+	return PlayStore(sn)
+# END build_play_store
+
+# TODO: make a method of Game class
+#===============================================================================
+#  (P[hm win], finalScore) = predictGm(Vhm, Vvs, ('H'|'N'), ('M'|'W'))
+#-------------------------------------------------------------------------------
+
+# TODO: make a method of Game class
+#===============================================================================
+#  {'V2H':, 'H2V':} = valueGm(scDiff, ('H'|'N'), ('M'|'W'))
+#-------------------------------------------------------------------------------
+def valueGm(scDiff, HorN, MorW):
+	'''Game valuing function
+	
+	Here's the idea.  If, for example, a team wins by 16 at home then this
+	performance is better than 68.5% (or 1 stdev) of all other game outcomes.
+	Therefore, the random walker voter will judge this team as
+	the better team 68.5% of the time.  Or, 68.5% of RW voters will pick that
+	team as better.
+	'''
+	(V2H, H2V) = valueGms(scDiff, HorN, MorW)
+	
+	return {'V2H': float(V2H), 'H2V': float(H2V)}
+# END valueGm
+
+#===============================================================================
+def _score_params(MorW):
+	'''Home edge and standard deviation in score for a gender (str), or
+	arrays of them for an array of genders
+	'''
+	if isinstance(MorW, basestring):
+		if MorW.lower() == 'm': return GM_SCORE_PARAMS['M']
+		return GM_SCORE_PARAMS['W']
+	# END if
+	
+	isM = np.char.lower( np.asarray(MorW, dtype=str) ) == 'm'
+	(muM, sigM) = GM_SCORE_PARAMS['M']
+	(muW, sigW) = GM_SCORE_PARAMS['W']
+	return (np.where(isM, muM, muW), np.where(isM, sigM, sigW))
+# END _score_params
+
+def _is_hosted(HorN):
+	'''True where a game site, "H" or "N" (or already a bool), is hosted
+	'''
+	HorN = np.asarray(HorN)
+	if HorN.dtype == bool: return HorN
+	return np.char.lower( HorN.astype(str) ) == 'h'
+# END _is_hosted
+
+#===============================================================================
+def valueGms(scDiffs, HorNs, MorWs):
+	'''Batch game valuing function
+	
+	valueGm for many games at once, with one erf call
+	
+	Args:
+		scDiffs (array-like): home minus visiting team score of each game
+		HorNs (array-like|str): site of each game, "H" for hosted and "N" for
+			neutral, or bools (True for hosted), or one site for all
+		MorWs (array-like|str): gender of each game, or one for all
+	Returns:
+		tuple.  (V2H (numpy.ndarray), H2V (numpy.ndarray))
+	'''
+	(mu, sig) = _score_params(MorWs)
+	adjScDiffs = np.asarray(scDiffs, dtype=float) - mu*_is_hosted(HorNs)
+	
+	V2H = 0.5*(1.0 + erf( adjScDiffs / (sqrt(2.0)*sig) ))
+	
+	return (V2H, 1.0 - V2H)
+# END valueGms
+
+#===============================================================================
+def predictGm(Vhm, Vvs, HorN, MorW):
+	'''Game predicting function
+	
+	The inverse of valueGm.  The share of random walker voters picking the
+	home team, Vhm/(Vhm+Vvs), is turned back into the score difference that
+	valueGm would give that share, and the home win probability is that of
+	the site-adjusted margin under the same normal score model.
+	
+	Args:
+		Vhm (float): home team's random-walker value
+		Vvs (float): visiting team's random-walker value
+		HorN (str): "H" for a hosted game, "N" for a neutral site
+		MorW (str): gender, "M" or "W"
+	Returns:
+		tuple.  (probability of a home win, expected home margin)
+	'''
+	(pHm, pnts) = predictGms(Vhm, Vvs, HorN, MorW)
+	
+	return (float(pHm), float(pnts))
+# END predictGm
+
+#===============================================================================
+def predictGms(Vhms, Vvss, HorNs, MorWs):
+	'''Batch game predicting function
+	
+	predictGm for many games at once.  The arguments are broadcast against
+	each other as numpy arrays, so any of them can be a single value.
+	
+	Args:
+		Vhms (array-like): home teams' random-walker values
+		Vvss (array-like): visiting teams' random-walker values
+		HorNs (array-like|str): sites, as for valueGms
+		MorWs (array-like|str): genders, as for valueGms
+	Returns:
+		tuple.  (probabilities of a home win (numpy.ndarray), expected home
+			margins (numpy.ndarray))
+	'''
+	(mu, sig) = _score_params(MorWs)
+	Vhms = np.asarray(Vhms, dtype=float)
+	
+	pnts = (
+		sqrt(2.0)*sig*erfinv(2.0*Vhms/(Vhms + Vvss) - 1.0) +
+		mu*_is_hosted(HorNs)
+	)
+	pHms = 0.5*(1.0 + erf( pnts / (sqrt(2.0)*sig) ))
+	
+	return (pHms, pnts)
+# END predictGms
+
+#===============================================================================
+def predictAllPairs(V, HorN='N', MorW='M'):
+	'''Predict the game between every pair of teams
+	
+	Args:
+		V (array-like): random-walker values of N teams
+		HorN = 'N' (str): site of every game, "H" for hosted or "N" neutral
+		MorW = 'M' (str): gender
+	Returns:
+		tuple.  (P, margins), N x N numpy.ndarrays with element [i, j] for
+			team i at home to team j
+	'''
+	V = np.asarray(V, dtype=float)
+	return predictGms(V[:, np.newaxis], V[np.newaxis, :], HorN, MorW)
+# END predictAllPairs
+
+#===============================================================================
+def predictFutureGms(arg, results):
+	'''Predict every game in a season's future games file
+	
+	Args:
+		arg (core.League|core.SeasonName): season of the
+			"future_games_<season>.csv" file written by
+			collection.download_gm_links
+		results (list): team rankings as returned by rwRank
+	Returns:
+		list.  [(gmhc, vsTm, hmTm, P[hm win], expected home margin), ...] with
+			NaN for games of unranked teams
+	'''
+	sn, leag = _parse_season_arg(arg)
+	futureGms = ampLib.csv2LD(
+		'future_games_{0}.csv'.format(sn),
+		columns=core.CSV_SCHEMAS['future_games']
+	)
+	
+	# teams outside D1 were ranked as one, by the league's non-D1 name
+	tmVals = dict((tm, v) for (tm, tmPID, rnk, v, pnts, N, W) in results)
+	D1tms = set(leag.tm_nms)
+	def tmVal(tm):
+		if tm not in D1tms: tm = leag.non_D1_name
+		return tmVals.get(tm, np.nan)
+	# END tmVal
+	
+	Vhms = [tmVal(tm) for tm in futureGms['hmTm']]
+	Vvss = [tmVal(tm) for tm in futureGms['vsTm']]
+	HorNs = [gmhc[8] for gmhc in futureGms['gmhc']]
+	(pHms, pnts) = predictGms(Vhms, Vvss, HorNs, sn.gender)
+	
+	return zip(
+		futureGms['gmhc'], futureGms['vsTm'], futureGms['hmTm'],
+		pHms.tolist(), pnts.tolist()
+	)
+# END predictFutureGms
+
+#===============================================================================
+def box_scores(arg):
+	'''Box Score Table Function
+	
+	Final scores, sites and teams of a season's games as typed numpy
+	arrays, taken straight from a SeasonData or from the played games csv
+	file written by collection.download_gm_links
+	
+	Args:
+		arg (SeasonData|core.League|core.SeasonName): a loaded season, or a
+			season whose "played_games_<season>.csv" file to read
+	Returns:
+		dict.  Arrays with one entry per game, in hashcode order:
+			gm_hcs (S16), date (int32, yyyymmdd), hosted (bool), hm and vs
+			(int32, team prime hash values, 2 for any non-D1 team), hm_sc
+			and vs_sc (int16, final scores)
+	'''
+	box = {}
+	if isinstance(arg, SeasonData):
+		leag = arg.leag
+		box['gm_hcs'] = np.array(arg.gm_hcs, dtype='S16')
+		if hasattr(arg, 'store'):
+			# a game's final score is in its last play
+			store = arg.store
+			pos = dict(
+				(gmhc, i) for (i, gmhc) in enumerate(store.gm_hcs.tolist())
+			)
+			iGms = np.array([pos[gmhc] for gmhc in arg.gm_hcs], dtype=int)
+			iLast = store.gm_start[iGms+1] - 1
+			tmPhvs = np.array([leag(tm).phv for tm in store.tm_nms])
+			box['hm'] = tmPhvs[store.hm[iGms]]
+			box['vs'] = tmPhvs[store.vs[iGms]]
+			box['hm_sc'] = store.hm_sc[iLast]
+			box['vs_sc'] = store.vs_sc[iLast]
+		else:
+			gms = [arg.gms[gmhc] for gmhc in arg.gm_hcs]
+			box['hm'] = [gm.hm.phv for gm in gms]
+			box['vs'] = [gm.vs.phv for gm in gms]
+			box['hm_sc'] = [gm.plays[-1][3] for gm in gms]
+			box['vs_sc'] = [gm.plays[-1][2] for gm in gms]
+		# END if
+	else:
+		sn, leag = _parse_season_arg(arg)
+		# (gmhc, vsTm, vsSc, hmTm, hmSc)
+		rows = sorted( ampLib.iter_csv(
+			'played_games_{0}.csv'.format(sn),
+			core.CSV_SCHEMAS['played_games'][:5]
+		) )
+		tmPhvs = {}
+		for row in rows:
+			for tm in (row[1], row[3]):
+				if tm not in tmPhvs: tmPhvs[tm] = leag(tm).phv
+			# END for
+		# END for
+		box['gm_hcs'] = np.array([row[0] for row in rows], dtype='S16')
+		box['hm'] = [tmPhvs[row[3]] for row in rows]
+		box['vs'] = [tmPhvs[row[1]] for row in rows]
+		box['hm_sc'] = [row[4] for row in rows]
+		box['vs_sc'] = [row[2] for row in rows]
+	# END if
+	
+	return _box_columns(box)
+# END box_scores
+
+def _box_columns(box):
+	'''Finish a box score table from its gm_hcs, hm, vs, hm_sc and vs_sc
+	'''
+	gm_hcs = box['gm_hcs']
+	box['date'] = gm_hcs.astype('S8').astype(np.int32)
+	box['hosted'] = gm_hcs.view('S1').reshape(-1, 16)[:, 8] != 'N'
+	for col in ('hm', 'vs'):
+		box[col] = np.asarray(box[col], dtype=np.int32)
+	for col in ('hm_sc', 'vs_sc'):
+		box[col] = np.asarray(box[col], dtype=np.int16)
+	
+	return box
+# END _box_columns
+
+#===============================================================================
+def _rw_matrix(hmIDs, vsIDs, pV2H, numTms, weights=None):
+	'''Build the sparse random walker graph matrix, D
+	
+	For every game the walkers at the home vertex leave for the visitor with
+	rate pH2V, and those at the visitor leave for home with rate pV2H, both
+	times the game's weight if weights are given.  The columns of D sum to
+	zero and its equilibrium, V, solves D.V = 0.
+	'''
+	pH2V = 1.0 - pV2H
+	if weights is not None:
+		pV2H = weights * pV2H
+		pH2V = weights * pH2V
+	# END if
+	rows = np.concatenate([hmIDs, hmIDs, vsIDs, vsIDs])
+	cols = np.concatenate([hmIDs, vsIDs, vsIDs, hmIDs])
+	vals = np.concatenate([-pH2V, pV2H, -pV2H, pH2V])
+	
+	# duplicate entries (rematches) are summed
+	return sp.sparse.coo_matrix(
+		(vals, (rows, cols)), shape=(numTms, numTms)
+	).tocsr()
+# END _rw_matrix
+
+#===============================================================================
+def _rw_solve(D, labels=None, V0=None):
+	'''Solve for the equilibrium of a random walker graph matrix
+	
+	Each connected subgraph has the value of its last vertex fixed at 1,
+	which is the solution that row elimination and back substitution of the
+	dense matrix gives.  Since the subgraphs are uncoupled, the rest of the
+	values are solved for together, by a sparse direct solve or, given a
+	starting guess, by BiCGSTAB started from it.
+	
+	Args:
+		D (scipy.sparse.csr_matrix): graph matrix from _rw_matrix
+		labels = None (numpy.ndarray): subgraph label of every vertex, found
+			from D if not given
+		V0 = None (numpy.ndarray): starting guess for an iterative solve
+	Returns:
+		tuple.  (V (numpy.ndarray), number of subgraphs)
+	'''
+	numTms = D.shape[0]
+	if labels is None:
+		nGroups, labels = sp.sparse.csgraph.connected_components(
+			D, directed=True, connection='weak'
+		)
+	# END if
+	grpLabels, grps = np.unique(labels, return_inverse=True)
+	nGroups = len(grpLabels)
+	
+	iLast = np.zeros(nGroups, dtype=int)
+	np.maximum.at(iLast, grps, np.arange(numTms))
+	isFree = np.ones(numTms, dtype=bool)
+	isFree[iLast] = False
+	free = np.flatnonzero(isFree)
+	
+	# D[free,free].x = b, with b the flow from the fixed vertices
+	b = -D.dot( (~isFree).astype(float) )[free]
+	V = np.ones(numTms)
+	if len(free) == 0: return V, nGroups
+	
+	if V0 is None:
+		A = D[free][:, free].tocsc()
+		V[free] = sp.sparse.linalg.spsolve(A, b)
+	else:
+		def matvec(x):
+			z = np.zeros(numTms)
+			z[free] = x
+			return D.dot(z)[free]
+		# END matvec
+		A = sp.sparse.linalg.LinearOperator(
+			(len(free), len(free)), matvec=matvec, dtype=float
+		)
+		dInv = 1.0 / D.diagonal()[free]
+		Minv = sp.sparse.linalg.LinearOperator(
+			(len(free), len(free)), matvec=lambda x: dInv*x, dtype=float
+		)
+		x0 = (V0 / V0[iLast][grps])[free]
+		x, info = sp.sparse.linalg.bicgstab(
+			A, b, x0=x0, tol=1E-12, atol=0.0, M=Minv
+		)
+		if info != 0:
+			x = sp.sparse.linalg.spsolve(D[free][:, free].tocsc(), b)
+		# END if
+		V[free] = x
+	# END if
+	
+	return V, nGroups
+# END _rw_solve
+
+#===============================================================================
+def _rw_games(dataInput, MorW, leag, by_date=False):
+	'''Digest game data for the ranking functions
+	
+	Args:
+		dataInput, MorW, leag: as for rwRank
+		by_date = False (bool): if True, games are put in date order first
+	Returns:
+		tuple.  (MorW, leag, team names, box score table, home team numbers,
+			visiting team numbers, score differences, V2H values), teams being
+			numbered in order of appearance
+	'''
+	if type(dataInput) is str:
+		# Read in game data, column-wise
+		boxData = ampLib.csv2LD(
+			dataInput, columns=[
+				('gmID', str), ('home', str), ('visitor', str), ('hmSc', int),
+				('vsSc', int)
+			]
+		)
+		box = None
+		#  expect file name to be "box_data_(M|W)_10-11.csv"
+		gy = re.search(r'_(M|W)_(\d\d)-\d\d\.csv$', dataInput).groups()
+		MorW = gy[0]
+		if leag is None:
+			leag = core.League( core.SeasonName(gy[0], '20'+gy[1]) )
+		# END if
+	elif isinstance(dataInput, SeasonData):
+		box = box_scores(dataInput)
+		MorW = dataInput.sn.gender
+		if leag is None: leag = dataInput.leag
+	else:
+		if leag is None:
+			raise ValueError('a core.League is needed to rank a list of games')
+		# END if
+		box = dataInput
+		boxData = dataInput
+	# END if
+	
+	#DEBUG: Example League
 	#allTms = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
 	#boxData = [
 	#    {'gmID':'12345678H', 'home':'A', 'hmSc':80, 'visitor':'B', 'vsSc': 70},
@@ -408,87 +1958,137 @@ def rwRank(dataInput, MorW='M'):
 	#    {'gmID':'12345678H', 'home':'F', 'hmSc':60, 'visitor':'G', 'vsSc': 68},
 	#]
 	
-	# Digest game data
-	gmTups = []
-	winCnts = []
-	tmLeg = {}
-	tmLegR = {}
-	iTm = 0
-	for gmD in boxData:
-		hmtm = gmD['home']
-		if hmtm not in allTms:
-			hmtm = nonD1tm
-		vstm = gmD['visitor']
-		if vstm not in allTms:
-			vstm = nonD1tm
-		
-		scDiff = gmD['hmSc'] - gmD['vsSc']
-		p = valueGm(scDiff, gmD['gmID'][8], MorW)
-		
-		if hmtm not in tmLeg.keys():
-			hmIDnum = iTm
-			iTm += 1
-			tmLeg[hmtm] = hmIDnum
-			tmLegR[hmIDnum] = hmtm
-			winCnts.append({'N': 0, 'W': 0, 'EW': 0.0})
-		else:
-			hmIDnum = tmLeg[hmtm]
-		
-		if vstm not in tmLeg.keys():
-			vsIDnum = iTm
-			iTm += 1
-			tmLeg[vstm] = vsIDnum
-			tmLegR[vsIDnum] = vstm
-			winCnts.append({'N': 0, 'W': 0, 'EW': 0.0})
-		else:
-			vsIDnum = tmLeg[vstm]
-		
-		gmTups.append( (hmIDnum, vsIDnum, p['V2H']) )
-		winCnts[hmIDnum]['N'] += 1
-		winCnts[vsIDnum]['N'] += 1
-		if scDiff > 0:
-			winCnts[hmIDnum]['W'] += 1
-		else:
-			winCnts[vsIDnum]['W'] += 1
-	# End for gmD in boxData
+	if type(box) is not dict:
+		if type(boxData) is list:
+			# rows of a box data file
+			boxData = dict(
+				(col, [gmD[col] for gmD in boxData])
+				for col in ('gmID', 'home', 'visitor', 'hmSc', 'vsSc')
+			)
+		# END if
+		# teams outside D1 all get the non-D1 phv
+		box = _box_columns({
+			'gm_hcs': np.array(boxData['gmID'], dtype='S16'),
+			'hm': [leag(tm).phv for tm in boxData['home']],
+			'vs': [leag(tm).phv for tm in boxData['visitor']],
+			'hm_sc': [int(sc) for sc in boxData['hmSc']],
+			'vs_sc': [int(sc) for sc in boxData['vsSc']]
+		})
+	# END if
+	
+	if by_date:
+		iGms = np.argsort(box['date'], kind='mergesort')
+		box = dict( (col, vals[iGms]) for (col, vals) in box.items() )
+	# END if
+	
+	# Digest game data, teams are numbered in order of appearance
+	tmPhvs, iFirst, tmIDs = np.unique(
+		np.column_stack([box['hm'], box['vs']]).ravel(),
+		return_index=True, return_inverse=True
+	)
+	iOrder = np.argsort(iFirst)
+	renumber = np.empty(len(iOrder), dtype=int)
+	renumber[iOrder] = np.arange(len(iOrder))
+	tmIDs = renumber[tmIDs].reshape(-1, 2)
+	hmIDs = tmIDs[:, 0]
+	vsIDs = tmIDs[:, 1]
+	tmLegR = [leag( int(phv) ).name for phv in tmPhvs[iOrder]]
+	
+	scDiffs = box['hm_sc'].astype(float) - box['vs_sc']
+	pV2H = valueGms(scDiffs, box['hosted'], MorW)[0]
+	
+	return (MorW, leag, tmLegR, box, hmIDs, vsIDs, scDiffs, pV2H)
+# END _rw_games
+
+#===============================================================================
+def _win_counts(hmIDs, vsIDs, scDiffs, numTms):
+	'''Games played and won by each team, ties go to the visitor
+	'''
+	N = np.bincount(hmIDs, minlength=numTms)
+	N += np.bincount(vsIDs, minlength=numTms)
+	W = np.bincount(hmIDs[scDiffs > 0], minlength=numTms)
+	W += np.bincount(vsIDs[scDiffs <= 0], minlength=numTms)
+	
+	return (N, W)
+# END _win_counts
+
+#===============================================================================
+def _rank_results(tm_nms, tm_ids, V, pnts, N, W):
+	'''Sort teams by value into a list of Ranking tuples
+	'''
+	iRanked = sorted(range(len(V)), key=lambda i: V[i], reverse=True)
+	return [
+		Ranking(
+			tm_nms[iTm], tm_ids[iTm], rnk+1, float(V[iTm]),
+			float(pnts[iTm]), int(N[iTm]), int(W[iTm])
+		)
+		for (rnk, iTm) in enumerate(iRanked)
+	]
+# END _rank_results
+
+#===============================================================================
+def _write_rankings(
+	results, file_name, value_name='Vetrex Value', pnts_name=None
+):
+	'''Save a list of Ranking tuples in a csv file
+	
+	The last column is the score over the median team, or, if pnts_name is
+	given, a value over the median team's under that name
+	'''
+	if pnts_name is None:
+		pnts_name = 'Score Over Median Team'
+		pnts_fmt = '{7:+0.2f}'
+	else:
+		pnts_fmt = '{7:+0.5f}'
+	# END if
+	
+	f = open(file_name, 'w')
+	f.write(
+		'Rank,Team Prime ID,Team Name,Record,Win Pct,{0},{1}\n'.format(
+			value_name, pnts_name
+		)
+	)
+	lnStr = (
+		'{0},{1},{2},"{3:2d} - {4:2d}",{5:0.3f},{6:0.5f},' + pnts_fmt + '\n'
+	)
+	for (tm, tmPID, rnk, v, pnts, N, W) in results:
+		f.write(
+			lnStr.format(rnk, tmPID, tm, W, N-W, float(W)/N, v, pnts)
+		)
+	f.close()
+# END _write_rankings
+
+# TODO: make a method of SeasonData class
+#===============================================================================
+def rwRank(dataInput, MorW='M', leag=None):
+	'''Random-Walker Ranking Function
+	
+	Args:
+		dataInput (str|list|dict|SeasonData): name of a box data file, e.g.
+			"box_data_M_10-11.csv", a list of its rows as dicts, a box score
+			table from box_scores, or a season of games
+		MorW = 'M' (str): gender, taken from dataInput for a file name or a
+			SeasonData
+		leag = None (core.League): league of the teams, needed for a list
+			of rows or a box score table
+	Returns:
+		list.  [Ranking, ...] with the teams' prime hash values as ids
+	'''
+	(MorW, leag, tmLegR, box, hmIDs, vsIDs, scDiffs, pV2H) = _rw_games(
+		dataInput, MorW, leag
+	)
 	
 	# Record graph size
-	numTms = iTm
+	numTms = len(tmLegR)
 	print 'Number of Vertices on Graph = {0}'.format(numTms)
-	iSet = range(0, numTms)
-	
-	# Set up graph matrix
-	D = [[0.0 for j in iSet] for i in iSet]
-	for (hmIDnum, vsIDnum, pV2H) in gmTups:
-		pH2V = 1.0 - pV2H
-		
-		D[hmIDnum][hmIDnum] -= pH2V
-		D[hmIDnum][vsIDnum] += pV2H
-		
-		D[vsIDnum][vsIDnum] -= pV2H
-		D[vsIDnum][hmIDnum] += pH2V
-	
-	# Solve for equilibrium by row elimination
-	Dreduc = ampMath.rowElim(D)
-	
-	V = [0.0 for i in iSet]
-	A = 1.0
-	nGroups = 0
-	iBackwards = sorted(iSet, reverse=True)
-	for i in iBackwards:
-		for j in range(i+1,numTms):
-			V[i] -= Dreduc[i][j]*V[j]
-		if V[i] == 0.0:
-			V[i] = 1.0
-			nGroups += 1
-		A += V[i]
+	
+	# Set up graph matrix and solve for equilibrium
+	D = _rw_matrix(hmIDs, vsIDs, pV2H, numTms)
+	V, nGroups = _rw_solve(D)
 	
 	# Normalize team values
-	A /= numTms
-	Veq = sp.array(V)
-	for i in iSet:
-		V[i] = (i, V[i]/A)
-		Veq[i] = Veq[i]/A
+	A = (1.0 + V.sum()) / numTms
+	Veq = V / A
 	
 	# Display graph connected-ness
 	if nGroups == 1:
@@ -497,40 +2097,474 @@ def rwRank(dataInput, MorW='M'):
 		print 'Graph Unconnected, with {0} subgroups'.format(nGroups)
 	
 	# Check equilibrium values
-	Dmatrix = sp.array(D)
-	dV = sp.dot(Dmatrix,Veq)
+	dV = D.dot(Veq)
 	dVnorm = norm(dV)
 	print '|dV| = {0:0.8e}'.format(dVnorm)
 	
-	# Rank teams and translate values to "points"
-	V = sorted(V, key=lambda (i,v): v, reverse=True)
-	medianValue = V[len(V)/2][1]
-	results = []
-	rnk = 1
-	for (iTm, v) in V:
-		tm = tmLegR[iTm]
-		tmPID = tmIds(tm)
-		# points over a median team at a neutral site
-		# TODO: predictGm undefined, fix this
-		(pHm, pnts) = predictGm(v, medianValue, 'N', 'M')
-		N = winCnts[iTm]['N']
-		W = winCnts[iTm]['W']
-		results.append( (tm, tmPID, rnk, v, pnts, N, W) )
-		rnk += 1
+	# Rank teams and translate values to "points" over a median team at a
+	# neutral site
+	medianValue = np.sort(Veq)[::-1][numTms/2]
+	allPnts = predictGms(Veq, medianValue, 'N', MorW)[1]
+	results = _rank_results(
+		tmLegR, [leag(tm).phv for tm in tmLegR], Veq, allPnts,
+		*_win_counts(hmIDs, vsIDs, scDiffs, numTms)
+	)
 	
 	# save results in a csv file
-	f = open('rankings_'+MorW+'.csv', 'w')
-	f.write(
-		'Rank,Team Prime ID,Team Name,Record,Win Pct,Vetrex Value,'
-		+ 'Score Over Median Team\n'
+	_write_rankings(results, 'rankings_'+MorW+'.csv')
+	
+	return results
+# END rwRank
+
+#===============================================================================
+def rwHistory(dataInput, MorW='M', leag=None):
+	'''Random-Walker Ranking History Function
+	
+	Replays a season's games in date order and finds the random-walker team
+	values after every day of games, as rwRank would give for the games
+	played up to then.  The graph matrix has the sparsity pattern of the
+	whole season from the start, each day only adds that day's games to its
+	entries, and each day's solve is started from the day before's values.
+	
+	Args:
+		dataInput, MorW, leag: as for rwRank
+	Returns:
+		tuple.  (dates, team names, values) with values a numpy.ndarray of
+			shape (len(dates), len(team names)), NaN for a team that has not
+			played yet
+	'''
+	(MorW, leag, tmLegR, box, hmIDs, vsIDs, scDiffs, pV2H) = _rw_games(
+		dataInput, MorW, leag, by_date=True
 	)
-	for (tm, tmPID, rnk, v, pnts, N, W) in results:
-		lnStr = '{0},{1},{2},"{3:2d} - {4:2d}",{5:0.3f},{6:0.5f},{7:+0.2f}\n'
-		f.write(
-			lnStr.format(rnk, tmPID, tm, W, N-W, float(W)/N, v, pnts)
+	numTms = len(tmLegR)
+	numGms = len(scDiffs)
+	
+	# The whole season's matrix gives the sparsity pattern, every game's 4
+	# entries are then found in its data array by their (row, column) keys,
+	# which are in sorted order
+	D = _rw_matrix(hmIDs, vsIDs, pV2H, numTms)
+	D.sort_indices()
+	keys = np.repeat(np.arange(numTms), np.diff(D.indptr))*numTms + D.indices
+	gmPos = np.array([
+		np.searchsorted(keys, rows*numTms + cols)
+		for (rows, cols) in [
+			(hmIDs, hmIDs), (hmIDs, vsIDs), (vsIDs, vsIDs), (vsIDs, hmIDs)
+		]
+	])
+	gmVals = np.array([-(1.0-pV2H), pV2H, -pV2H, 1.0-pV2H])
+	D.data[:] = 0.0
+	
+	# union-find forest of the subgraphs
+	parent = np.arange(numTms)
+	def root(i):
+		while parent[i] != i:
+			parent[i] = parent[parent[i]]
+			i = parent[i]
+		# END while
+		return i
+	# END root
+	
+	gmDates = box['date'].tolist()
+	dates = sorted(set(gmDates))
+	values = np.empty((len(dates), numTms))
+	played = np.zeros(numTms, dtype=bool)
+	labels = np.arange(numTms)
+	V = None
+	k = 0
+	for (d, date) in enumerate(dates):
+		k0 = k
+		merged = False
+		while k < numGms and gmDates[k] == date:
+			rHm = root(hmIDs[k])
+			rVs = root(vsIDs[k])
+			if rHm != rVs:
+				parent[rHm] = rVs
+				merged = True
+			# END if
+			k += 1
+		# END while
+		for r in range(4):
+			np.add.at(D.data, gmPos[r, k0:k], gmVals[r, k0:k])
+		# END for
+		played[hmIDs[k0:k]] = True
+		played[vsIDs[k0:k]] = True
+		
+		if merged: labels = np.array([root(i) for i in range(numTms)])
+		V, nGroups = _rw_solve(D, labels, V)
+		
+		# normalize as in rwRank, over the teams that have played
+		A = (1.0 + V[played].sum()) / played.sum()
+		values[d] = np.where(played, V/A, np.nan)
+	# END for
+	
+	return ([str(date) for date in dates], tmLegR, values)
+# END rwHistory
+
+#===============================================================================
+def _bootstrap_chunk(hmIDs, vsIDs, pV2H, numTms, seed, n_reps):
+	'''Process pool worker for rwBootstrap
+	
+	Solves n_reps resampled replicates of a season's random walker graph as
+	one block-diagonal sparse matrix.  Returns the replicates' normalized
+	team values as an (n_reps, numTms) array, NaN for a team with no games
+	in a replicate.
+	'''
+	rs = np.random.RandomState(seed)
+	numGms = len(hmIDs)
+	picks = rs.randint(0, numGms, (n_reps, numGms))
+	offsets = numTms * np.arange(n_reps)[:, np.newaxis]
+	repHmIDs = (hmIDs[picks] + offsets).ravel()
+	repVsIDs = (vsIDs[picks] + offsets).ravel()
+	
+	D = _rw_matrix(repHmIDs, repVsIDs, pV2H[picks].ravel(), n_reps*numTms)
+	V = _rw_solve(D)[0].reshape(n_reps, numTms)
+	
+	played = np.zeros(n_reps*numTms, dtype=bool)
+	played[repHmIDs] = True
+	played[repVsIDs] = True
+	played = played.reshape(n_reps, numTms)
+	
+	# normalize as in rwRank, over each replicate's teams
+	A = (1.0 + np.where(played, V, 0.0).sum(axis=1)) / played.sum(axis=1)
+	return np.where(played, V / A[:, np.newaxis], np.nan)
+# END _bootstrap_chunk
+
+#===============================================================================
+def _replicate_ranks(repVs):
+	'''Rank the teams of each bootstrap replicate (row of repVs), teams
+	without games (NaN values) being sorted last and given a NaN rank
+	'''
+	absent = np.isnan(repVs)
+	iOrder = np.argsort(np.where(absent, np.inf, -repVs), axis=1)
+	repRnks = np.empty(repVs.shape)
+	repRnks[np.arange(len(repVs))[:, np.newaxis], iOrder] = np.arange(
+		1, repVs.shape[1]+1
+	)
+	repRnks[absent] = np.nan
+	
+	return repRnks
+# END _replicate_ranks
+
+#===============================================================================
+def rwBootstrap(
+	dataInput, MorW='M', leag=None, n_reps=1000, procs=None, seed=0,
+	pcts=(2.5, 50.0, 97.5), chunk_size=25
+):
+	'''Random-Walker Ranking Bootstrap Function
+	
+	Finds the spread of the random-walker rankings by re-ranking resampled
+	seasons, each one as many games drawn, with replacement, from the games
+	played.  Replicates are solved in chunks, as block-diagonal sparse
+	matrices, on a process pool.  Team numbering, and so the vertex held
+	fixed in each solve, is that of the full season.
+	
+	Args:
+		dataInput, MorW, leag: as for rwRank
+		n_reps = 1000 (int): number of resampled seasons
+		procs = None (int|multiprocessing.pool.Pool): number of processes,
+			defaults to the number of CPUs, or a pool of processes to use
+		seed = 0 (int): random seed, results do not depend on procs
+		pcts = (2.5, 50.0, 97.5) (tuple): percentiles to report
+		chunk_size = 25 (int): replicates solved together
+	Returns:
+		list.  [(Ranking, value percentiles, rank percentiles), ...] in the
+			full season's ranking order, with the percentiles as tuples,
+			NaN values and None ranks for a team in no resampled season
+	'''
+	(MorW, leag, tmLegR, box, hmIDs, vsIDs, scDiffs, pV2H) = _rw_games(
+		dataInput, MorW, leag
+	)
+	numTms = len(tmLegR)
+	
+	# The full season's ranking
+	V = _rw_solve( _rw_matrix(hmIDs, vsIDs, pV2H, numTms) )[0]
+	Veq = V / ((1.0 + V.sum()) / numTms)
+	medianValue = np.sort(Veq)[::-1][numTms/2]
+	results = _rank_results(
+		tmLegR, [leag(tm).phv for tm in tmLegR], Veq,
+		predictGms(Veq, medianValue, 'N', MorW)[1],
+		*_win_counts(hmIDs, vsIDs, scDiffs, numTms)
+	)
+	
+	if isinstance(procs, int) or procs is None:
+		pool = mp.Pool(procs)
+	else:
+		pool = procs
+	# END if
+	try:
+		chunk_results = [
+			pool.apply_async(
+				_bootstrap_chunk,
+				(
+					hmIDs, vsIDs, pV2H, numTms, seed + i,
+					min(chunk_size, n_reps - i*chunk_size)
+				)
+			)
+			for i in range( (n_reps + chunk_size - 1) / chunk_size )
+		]
+		repVs = np.vstack([chunk_result.get() for chunk_result in chunk_results])
+	finally:
+		if pool is not procs:
+			pool.close()
+			pool.join()
+		# END if
+	# END try
+	
+	repRnks = _replicate_ranks(repVs)
+	
+	# a team whose games were drawn in no replicate has no percentiles
+	inReps = ~np.isnan(repVs).all(axis=0)
+	vPcts = np.empty((len(pcts), numTms))
+	vPcts[:] = np.nan
+	rnkPcts = vPcts.copy()
+	vPcts[:, inReps] = np.nanpercentile(repVs[:, inReps], pcts, axis=0)
+	rnkPcts[:, inReps] = np.nanpercentile(
+		repRnks[:, inReps], pcts, axis=0, interpolation='nearest'
+	)
+	tmIdx = dict( (tm, i) for (i, tm) in enumerate(tmLegR) )
+	return [
+		(
+			rnkd, tuple(vPcts[:, tmIdx[rnkd.tm]]),
+			tuple(
+				(None if np.isnan(r) else int(r))
+				for r in rnkPcts[:, tmIdx[rnkd.tm]]
+			)
 		)
-	f.close()
+		for rnkd in results
+	]
+# END rwBootstrap
+
+#===============================================================================
+def rwRankSeasons(args, half_life=365.0, end_date=None):
+	'''Multi-Season Random-Walker Ranking Function
+	
+	Ranks teams on the games of several seasons at once, with every game's
+	edges of the random walker graph weighted by
+	    0.5**(days before end_date / half_life)
+	Teams are matched across seasons by NCAA hashcode, since prime hash
+	values are only unique within one season's hashcode file, and all teams
+	outside D1 are one vertex.
+	
+	Args:
+		args (list): seasons of one gender, each a core.SeasonName,
+			core.League, or SeasonData, with box data read from the
+			"played_games_<season>.csv" files for the first two
+		half_life = 365.0 (float): days for a game's weight to halve
+		end_date = None (int): yyyymmdd date the weights decay back from,
+			games after it are left out, the last game's date by default
+	Returns:
+		list.  [Ranking, ...] with the teams' NCAA hashcodes as ids and
+			their names in the latest season they played in
+	'''
+	# Digest game data, teams are numbered in order of appearance
+	MorW = None
+	tmLeg = {}
+	tmLegR = []
+	tmNames = []
+	boxes = []
+	for arg in args:
+		if isinstance(arg, SeasonData):
+			leag = arg.leag
+			box = box_scores(arg)
+		else:
+			leag = _parse_season_arg(arg)[1]
+			box = box_scores(leag)
+		# END if
+		if MorW is None: MorW = leag.sn.gender
+		if leag.sn.gender != MorW:
+			raise ValueError('seasons must all be of one gender')
+		# END if
+		if end_date is not None:
+			inRange = box['date'] <= end_date
+			box = dict( (col, vals[inRange]) for (col, vals) in box.items() )
+		# END if
+		
+		# this season's prime hash values, in order of appearance, to team
+		# numbers, all non-D1 teams having the NCAA hashcode "0"
+		phvs, iFirst, iTms = np.unique(
+			np.column_stack([box['hm'], box['vs']]).ravel(),
+			return_index=True, return_inverse=True
+		)
+		seasonIDs = np.zeros(len(phvs), dtype=int)
+		for i in np.argsort(iFirst):
+			tm = leag( int(phvs[i]) )
+			if tm.ncaa_hc not in tmLeg:
+				tmLeg[tm.ncaa_hc] = len(tmLegR)
+				tmLegR.append(tm.ncaa_hc)
+				tmNames.append(tm.name)
+			# END if
+			# later seasons' names win
+			tmNames[tmLeg[tm.ncaa_hc]] = tm.name
+			seasonIDs[i] = tmLeg[tm.ncaa_hc]
+		# END for
+		box['tm_ids'] = seasonIDs[iTms].reshape(-1, 2)
+		boxes.append(box)
+	# END for
+	hmIDs = np.concatenate([b['tm_ids'][:, 0] for b in boxes])
+	vsIDs = np.concatenate([b['tm_ids'][:, 1] for b in boxes])
+	scDiffs = np.concatenate([
+		b['hm_sc'].astype(float) - b['vs_sc'] for b in boxes
+	])
+	dates = np.concatenate([b['date'] for b in boxes])
+	hosted = np.concatenate([b['hosted'] for b in boxes])
+	if len(scDiffs) == 0:
+		raise ValueError('no games on or before end_date')
+	# END if
+	numTms = len(tmLegR)
+	
+	# Weight games by age
+	def day(date):
+		date = str(date)
+		return datetime.date(
+			int(date[:4]), int(date[4:6]), int(date[6:8])
+		).toordinal()
+	# END day
+	uDates, iDates = np.unique(dates, return_inverse=True)
+	gmDays = np.array([day(date) for date in uDates], dtype=int)[iDates]
+	if end_date is None:
+		endDay = gmDays.max()
+	else:
+		endDay = day(end_date)
+	# END if
+	weights = 0.5**((endDay - gmDays) / float(half_life))
+	
+	pV2H = valueGms(scDiffs, hosted, MorW)[0]
+	D = _rw_matrix(hmIDs, vsIDs, pV2H, numTms, weights)
+	V, nGroups = _rw_solve(D)
+	Veq = V / ((1.0 + V.sum()) / numTms)
+	
+	# Rank teams and translate values to "points"
+	medianValue = np.sort(Veq)[::-1][numTms/2]
+	allPnts = predictGms(Veq, medianValue, 'N', MorW)[1]
+	return _rank_results(
+		tmNames, tmLegR, Veq, allPnts,
+		*_win_counts(hmIDs, vsIDs, scDiffs, numTms)
+	)
+# END rwRankSeasons
+
+#===============================================================================
+def _cg_solve(A, b):
+	'''Solve a sparse symmetric positive (semi-)definite system by Jacobi
+	preconditioned conjugate gradients
+	'''
+	dInv = 1.0 / A.diagonal()
+	Minv = sp.sparse.linalg.LinearOperator(
+		A.shape, matvec=lambda x: dInv*x, dtype=float
+	)
+	x, info = sp.sparse.linalg.cg(A, b, tol=1E-12, atol=0.0, M=Minv)
+	if info != 0:
+		raise RuntimeError(
+			'conjugate gradients did not converge ({0})'.format(info)
+		)
+	# END if
+	
+	return x
+# END _cg_solve
+
+#===============================================================================
+def masseyRank(dataInput, MorW='M', leag=None):
+	'''Massey Ranking Function
+	
+	Least-squares ratings in points: the home-edge adjusted score difference
+	of every game is fit by the home team's rating minus the visitor's.
+	The normal equations, X'X.r = X'y with X the sparse game-by-team design
+	matrix, are solved by conjugate gradients.  They fix ratings only up to
+	a constant on each connected group of teams, so each group's ratings are
+	set to average zero.
+	
+	Args:
+		dataInput, MorW, leag: as for rwRank
+	Returns:
+		list.  [Ranking, ...] with the teams' prime hash values as ids
+	'''
+	(MorW, leag, tmLegR, box, hmIDs, vsIDs, scDiffs, pV2H) = _rw_games(
+		dataInput, MorW, leag
+	)
+	numTms = len(tmLegR)
+	numGms = len(scDiffs)
+	
+	mu = _score_params(MorW)[0]
+	y = scDiffs - mu*box['hosted']
+	X = sp.sparse.coo_matrix(
+		(
+			np.concatenate([np.ones(numGms), -np.ones(numGms)]),
+			(np.tile(np.arange(numGms), 2), np.concatenate([hmIDs, vsIDs]))
+		),
+		shape=(numGms, numTms)
+	).tocsr()
+	XT = X.T.tocsr()
+	XTX = XT.dot(X)
+	r = _cg_solve(XTX, XT.dot(y))
+	
+	nGroups, labels = sp.sparse.csgraph.connected_components(
+		XTX, directed=False
+	)
+	grpMeans = np.bincount(labels, weights=r) / np.bincount(labels)
+	r -= grpMeans[labels]
+	
+	# points over the median team
+	medianValue = np.sort(r)[::-1][numTms/2]
+	results = _rank_results(
+		tmLegR, [leag(tm).phv for tm in tmLegR], r, r - medianValue,
+		*_win_counts(hmIDs, vsIDs, scDiffs, numTms)
+	)
+	_write_rankings(results, 'rankings_massey_'+MorW+'.csv', 'Massey Rating')
 	
 	return results
-# END rwRank
+# END masseyRank
 
+#===============================================================================
+def colleyRank(dataInput, MorW='M', leag=None):
+	'''Colley Ranking Function
+	
+	Win-based ratings from the Colley matrix system C.r = b, with
+	C = 2I + (games played on the diagonal, minus games between each pair of
+	teams off of it) and b = 1 + (wins - losses)/2.  C is symmetric positive
+	definite and sparse, and is solved by conjugate gradients.  Margins and
+	sites are ignored and ties count as losses for the home team.  The
+	points column holds each team's rating over the median team's, written
+	as "Rating Over Median Team".
+	
+	Args:
+		dataInput, MorW, leag: as for rwRank
+	Returns:
+		list.  [Ranking, ...] with the teams' prime hash values as ids
+	'''
+	(MorW, leag, tmLegR, box, hmIDs, vsIDs, scDiffs, pV2H) = _rw_games(
+		dataInput, MorW, leag
+	)
+	numTms = len(tmLegR)
+	
+	(N, W) = _win_counts(hmIDs, vsIDs, scDiffs, numTms)
+	numGms = len(scDiffs)
+	C = sp.sparse.coo_matrix(
+		(
+			np.concatenate([
+				2.0*np.ones(numTms), N.astype(float),
+				-np.ones(numGms), -np.ones(numGms)
+			]),
+			(
+				np.concatenate([
+					np.arange(numTms), np.arange(numTms), hmIDs, vsIDs
+				]),
+				np.concatenate([
+					np.arange(numTms), np.arange(numTms), vsIDs, hmIDs
+				])
+			)
+		),
+		shape=(numTms, numTms)
+	).tocsr()
+	b = 1.0 + (W - (N - W))/2.0
+	r = _cg_solve(C, b)
+	
+	medianValue = np.sort(r)[::-1][numTms/2]
+	results = _rank_results(
+		tmLegR, [leag(tm).phv for tm in tmLegR], r, r - medianValue, N, W
+	)
+	_write_rankings(
+		results, 'rankings_colley_'+MorW+'.csv', 'Colley Rating',
+		'Rating Over Median Team'
+	)
+	
+	return results
+# END colleyRank
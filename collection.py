@@ -2,7 +2,8 @@
 	Author: Alex Pronschinske
 	Module Version: 1 (developmental)
 	
-	List of classes: -none-
+	List of classes:
+		PbpWriter
 	List of functions:
 		download_gm_links
 		download_hashcodes
@@ -10,29 +11,35 @@
 		get_tm_schd
 		get_gm_pbp
 		parse_pbp_html
+		parse_tmpg
 	Module dependencies: 
 		ampLib
 		ampMath
 		core
-		multiprocessing
 		os
+		Queue
 		re
+		threading
 		urllib2
+		urltools
 '''
 
-import time
-
 import core
 
-import multiprocessing as mp
 import re
-from urllib2 import urlopen, URLError
+from urllib2 import URLError
 import os
+import Queue
+import threading
 import ampLib
 import ampMath
+import urltools
 
 #===============================================================================
-def download_gm_links(sn, silence=False, writeURLs=False):
+def download_gm_links(
+	sn, silence=False, writeURLs=False, max_inflight=20,
+	cache_dir='http_cache', offline=False
+):
 	'''This method will download webpages from NCAA.com and record web
 	links for all the games in the current season.
 	
@@ -41,6 +48,11 @@ def download_gm_links(sn, silence=False, writeURLs=False):
 		silence = False: switch for turning off print statements
 		writeURLs = False: If true a text file containing the links will
 			be saved.
+		max_inflight = 20: maximum number of team pages downloading at once
+		cache_dir = 'http_cache': directory of the on-disk cache of team
+			pages, unchanged pages are not downloaded again, None turns the
+			cache off
+		offline = False: If true team pages are read from the cache only
 	Returns:
 		(Lg, played_gms, future_gms)
 		Lg (League): League object used
@@ -83,61 +95,45 @@ def download_gm_links(sn, silence=False, writeURLs=False):
 	if not silence:
 		print 'begin collecting game links from team pages...'
 	
-	# Collect game links from individual team pages
-	# This section of code is uses multiple processes asynchronously
-	#crawl_results = urltools.open_urls(team_urls, 3, silence=False)
-	
-	#played_gms = []
-	#for (tm, url) in team_urls:
-	#	try:
-	#		played_gms.append( parse_tmpg(tm, crawl_results[url])
-	#	except Exception as err:
-	#		print '{0} on {1} page: {2}'.format(
-	#			type(err).__name__, tm, str(err)
-	#		)
-	#		raise err
-	#	# END try
-	# END for
-	
-	manager1 = mp.Manager()
-	pastgm_results = manager1.Queue()
-	manager2 = mp.Manager()
-	futuregm_results = manager2.Queue()
-	results = {'past': pastgm_results, 'future': futuregm_results}
-	
-	manager3 = mp.Manager()
-	count = manager3.Value('i', 0)
-	count_lock = manager3.Lock()
+	if cache_dir is None:
+		cache = None
+	else:
+		cache = urltools.ResponseCache(cache_dir, offline=offline)
+	# END if
 	
-	worker_pool = mp.Pool(processes=10*mp.cpu_count())
+	# Collect game links from individual team pages
+	# This section of code uses a pool of threads concurrently
+	tm_tasks = []
 	for (tm, url) in team_urls:
 		if tm.phv == 2: continue
-		
-		# Give team schedule url to worker pool
-		worker_pool.apply_async(
-			get_tm_schd, args=(tm.name, tm.ncaa_hc, url, results, count, count_lock)
-		)
+		tm_tasks.append( (tm.name, tm.ncaa_hc, url, cache) )
 	# END for
-	worker_pool.close()
-	
-	# Start an updater process
-	updater = mp.Process(
-		target=ampLib.update,
-		args=(len(team_urls), count, count_lock, 10)
+	schd_results = urltools.crawl(
+		get_tm_schd, tm_tasks, max_inflight=max_inflight, silence=silence
 	)
-	updater.start()
-	
-	# Wait here for all work to complete
-	worker_pool.join()
-	updater.terminate()
 	if not silence:
 		print 'All asynchronous work completed'
-	# Async. multiprocess code ended
+	# Concurrent code ended
+	
+	if cache is not None:
+		cache.evict()
+		if not silence:
+			print '{0} team pages unchanged, {1} downloaded'.format(
+				cache.n_hits, cache.n_misses
+			)
+		# END if
+	# END if
+	
+	past_results = []
+	future_results = []
+	for schd in schd_results:
+		if schd is None: continue
+		past_results.extend(schd[0])
+		future_results.extend(schd[1])
+	# END for
 	
-	# Get results out of Queue object
 	played_gms = []
-	while not results['past'].empty():
-		gm_data = results['past'].get()
+	for gm_data in past_results:
 		dateInt = gm_data[0]
 		HorN = gm_data[1]
 		hmhc = gm_data[2]
@@ -150,11 +146,10 @@ def download_gm_links(sn, silence=False, writeURLs=False):
 		
 		gmhc = '{0:08d}{1}{2:07d}'.format(dateInt, HorN, hmTm.phv*vsTm.phv)
 		played_gms.append( (gmhc, vsTm, vsSc, hmTm, hmSc, gm_link) )
-	# END while
+	# END for
 	
 	future_gms = []
-	while not results['future'].empty():
-		gm_data = results['future'].get()
+	for gm_data in future_results:
 		dateInt = gm_data[0]
 		HorN = gm_data[1]
 		hmhc = gm_data[2]
@@ -164,7 +159,7 @@ def download_gm_links(sn, silence=False, writeURLs=False):
 		
 		gmhc = '{0}{1}{2}'.format(dateInt, HorN, hmTm.phv*vsTm.phv)
 		future_gms.append( (gmhc, vsTm, hmTm) )
-	# END while
+	# END for
 	
 	# Each game will have been recorded twice, so remove duplicates and sort
 	played_gms = ampLib.uniquify(played_gms, lambda tup: tup[0])
@@ -221,14 +216,11 @@ def download_hashcodes(sn=None, test=False):
 	# Recursively call function for all seasons if one is not specified
 	if sn is None:
 		# Get team index page
-		tm_index_pg = urlopen(
+		tm_index_text = urltools.fetch(
 			'http://stats.ncaa.org/team/inst_team_list?'
 			+ 'sport_code=MBB'
-			+ '&division=1',
-			timeout=2*60
+			+ '&division=1'
 		)
-		tm_index_text = tm_index_pg.read()
-		tm_index_pg.close()
 		
 		# Get all availible years
 		all_yrs = re.findall(
@@ -250,15 +242,12 @@ def download_hashcodes(sn=None, test=False):
 	primes = ampMath.get_primes()
 	
 	# Get team index page
-	tm_index_pg = urlopen(
+	tm_index_text = urltools.fetch(
 		'http://stats.ncaa.org/team/inst_team_list?'
 		+ 'sport_code='+sn.gender+'BB'
 		+ '&division=1'
-		+ '&academic_year=' + str(sn.year+1),
-		timeout=2*60
+		+ '&academic_year=' + str(sn.year+1)
 	)
-	tm_index_text = tm_index_pg.read()
-	tm_index_pg.close()
 	
 	hash_pairs = re.findall(
 		r'''
@@ -292,7 +281,8 @@ def download_hashcodes(sn=None, test=False):
 
 #===============================================================================
 def download_pbp(
-	sn, Lg=None, played_gms=None, silence=False, write_skips=False
+	sn, Lg=None, played_gms=None, silence=False, write_skips=False,
+	max_inflight=20, max_queued=50, fsync_every=25
 ):
 	'''This method will download webpages from NCAA.com, record play-by-by
 	data from the pages, and save it as an AMP-style xml file.
@@ -306,6 +296,10 @@ def download_pbp(
 		silence = False: Bool controling print output
 		write_skips = False: If true a text file containing the skipped
 			links will be saved.
+		max_inflight = 20: maximum number of game pages downloading at once
+		max_queued = 50: maximum number of parsed games waiting to be written,
+			downloads pause while the queue is full
+		fsync_every = 25: number of games written between flushes to disk
 	Returns:
 		list.  Contains str's of game links that were skipped
 	'''
@@ -314,14 +308,9 @@ def download_pbp(
 	# string
 	if type(played_gms).__name__ == 'str':
 		print 'Reading in played games from "{0}"'.format(played_gms)
-		f = open(played_gms)
-		f.readline()
-		played_gms = []
-		for l in f:
-			lnVals = ampLib.csvline_to_list(l)
-			played_gms.append( tuple(lnVals) )
-		# END for
-		f.close()
+		played_gms = list(
+			ampLib.iter_csv(played_gms, core.CSV_SCHEMAS['played_games'])
+		)
 	elif type(played_gms).__name__ == 'list':
 		pass
 	else:
@@ -338,18 +327,18 @@ def download_pbp(
 		)
 	# END if
 	
-	# Load current season's data
+	# Load current season's data index
 	pbp_file_name = 'pbp_data_{0}.xml'.format(sn)
-	downloaded_gmhcs = core.pbp_data_census(pbp_file_name)
+	downloaded_gmhcs = core.PbpIndex(pbp_file_name, Lg)
 	
 	# Load current season's previous download errors
 	pbp_errors_fname = 'pbp_errors_{0}.csv'.format(sn)
 	if pbp_errors_fname in os.listdir('.'):
-		pbp_errors = ampLib.csv2LD(pbp_errors_fname)
-		pbp_errors_hashes = [d['gmID'] for d in pbp_errors]
+		pbp_errors_hashes = set( ampLib.csv2LD(
+			pbp_errors_fname, columns=core.CSV_SCHEMAS['pbp_errors']
+		)['gmID'] )
 	else:
-		pbp_errors = []
-		pbp_errors_hashes = []
+		pbp_errors_hashes = set()
 	# END if
 	
 	# Remove from URL list all games already recorded
@@ -396,68 +385,38 @@ def download_pbp(
 		print '{0} recorded games exist'.format(len(downloaded_gmhcs))
 		print '{0} new games to fetch'.format(n)
 	
-	# This section of code uses multiple processes asynchronously
-	# Setup parallel variables
-	manager1 = mp.Manager()
-	pbp_data_proxy = manager1.list()
-	pbp_data_lock = manager1.Lock()
-
-	manager2 = mp.Manager()
-	count = manager2.Value('i', 0)
-	count_lock = manager2.Lock()
-
-	worker_pool = mp.Pool(processes=10*mp.cpu_count())
+	# Every game is appended to the pbp database by the writer as soon as it
+	# has been parsed, so finished downloads survive an interruption
+	writer = PbpWriter(
+		pbp_file_name, max_queued, fsync_every, index=downloaded_gmhcs
+	)
+	def get_and_write_pbp(gm_url, gmhc):
+		tup = get_gm_pbp(gm_url, gmhc)
+		if tup is not None: writer.put(*tup)
+	# END get_and_write_pbp
 	
-	# Start up all processes
+	# This section of code uses a pool of threads concurrently
+	gm_tasks = []
 	for gm_data in played_gms:
-		gmhc = gm_data[0]
-		gm_url = gm_data[5]
-		worker_pool.apply_async(
-			get_gm_pbp,
-			args=(
-				gm_url, gmhc, pbp_data_proxy, pbp_data_lock, count, count_lock
-			)
-		)
+		# gm_data = (gmhc, vsTm, vsSc, hmTm, hmSc, gm_link)
+		gm_tasks.append( (gm_data[5], gm_data[0]) )
 	# END for
-	worker_pool.close()
-	
-	# Start an updater process
-	updater = mp.Process(
-		target=ampLib.update,
-		args=(len(played_gms), count, count_lock, 10)
-	)
-	updater.start()
-	
-	# Wait here for all work to complete
-	worker_pool.join()
-	updater.terminate()
+	try:
+		urltools.crawl(
+			get_and_write_pbp, gm_tasks, max_inflight=max_inflight,
+			silence=silence
+		)
+	finally:
+		writer.close()
+		downloaded_gmhcs.close()
+	# END try
 	if not silence:
 		print 'All asynchronous work completed'
-	# Async. multiprocess code ended
-	
-	pbp_data = []
-	with pbp_data_lock:
-		for tup in pbp_data_proxy:
-			pbp_data.append(tup)
-		# END for
-	# END with
-	
-	# TODO: function should end here, move writing code to another func
-	# Write the pbp and box score data to files
-	file_name = 'pbp_data_{0}.xml'.format(sn)
-	file_txt = ''
-	for gmhc, entry in pbp_data: file_txt += '{0}\n'.format(entry)
+	# Concurrent code ended
 	
-	if file_name in os.listdir('.'):
-		f = open(file_name, 'a')
-	else:
-		f = open(file_name, 'w')
-	# END if
-	f.write(file_txt)
-	f.close()
 	if not silence:
 		print '{0} games added to Play-by-Play database'.format(
-			len(pbp_data)
+			writer.n_written
 		)
 	# END if
 	
@@ -481,10 +440,111 @@ def download_pbp(
 # END download_pbp
 
 #===============================================================================
-def parse_tmpg(tm, pgtxt):
+class PbpWriter(object):
+	'''Play-by-Play Database Appending Writer Class
+	
+	Appends game entries to a pbp-xml database from a background thread.
+	Entries are handed over through a bounded queue, so producers block
+	whenever the writer falls behind and memory use does not grow with the
+	number of games being downloaded.  The file is flushed after every entry
+	and synced to disk every fsync_every entries and on close.  If the
+	database's core.PbpIndex is given it is updated with every entry written.
+	
+	Instantiation Args:
+		file_name (str): name of pbp-xml database file, created if missing
+		max_queued = 50: maximum number of entries waiting to be written
+		fsync_every = 25: number of entries between syncs to disk
+		index = None (core.PbpIndex): index of the database
+	Instance Attributes:
+		file_name (str)
+		fsync_every (int)
+		index (core.PbpIndex)
+		n_written (int)
+	Class Methods:
+		put
+		close
 	'''
+	
+	def __init__(self, file_name, max_queued=50, fsync_every=25, index=None):
+		self.file_name = file_name
+		self.fsync_every = fsync_every
+		self.index = index
+		self.n_written = 0
+		self._queue = Queue.Queue(maxsize=max_queued)
+		self._error = None
+		self._f = open(file_name, 'ab')
+		self._f.seek(0, 2)
+		self._thread = threading.Thread(target=self._run)
+		self._thread.daemon = True
+		self._thread.start()
+	# END __init__
+	
+	def _run(self):
+		while True:
+			item = self._queue.get()
+			if item is None: break
+			if self._error is not None: continue
+			
+			gmhc, entry = item
+			entry += '\n'
+			try:
+				offset = self._f.tell()
+				self._f.write(entry)
+				self._f.flush()
+				if self.index is not None:
+					self.index.append(gmhc, offset, entry)
+				self.n_written += 1
+				if self.n_written % self.fsync_every == 0:
+					os.fsync(self._f.fileno())
+			except Exception as err:
+				self._error = err
+			# END try
+		# END while
+	# END _run
+	
+	def put(self, gmhc, entry):
+		'''Queue a game entry for writing, blocks while the queue is full
+		
+		Args:
+			gmhc (str): game hashcode
+			entry (str): game's pbp-xml entry as made by parse_pbp_html
+		Returns: -none-
+		'''
+		if self._error is not None: raise self._error
+		self._queue.put( (gmhc, entry) )
+	# END put
+	
+	def close(self):
+		'''Write out all queued entries, sync and close the file
+		
+		Args: -none-
+		Returns: -none-
+		'''
+		if self._f.closed: return
+		self._queue.put(None)
+		self._thread.join()
+		self._f.flush()
+		os.fsync(self._f.fileno())
+		self._f.close()
+		if self._error is not None: raise self._error
+	# END close
+# END PbpWriter
+
+#===============================================================================
+def parse_tmpg(tmhc, pg_txt):
+	'''Parse the schedule table on a team's index page
+	
+	Args:
+		tmhc (str): NCAA hashcode of the team the page belongs to
+		pg_txt (str): text of the team's index page
+	Returns:
+		(past_gms, future_gms)
+		past_gms (list): [(dateInt, HorN, hmhc, hmSc, vshc, vsSc, gm_link), ..]
+		future_gms (list): [(dateInt, HorN, hmhc, vshc), ...]
 	'''
 	
+	past_gms = []
+	future_gms = []
 	rows = re.findall(r'<tr[^<>]*?>(.+?)</tr>', pg_txt, re.DOTALL)
 	for rowStr in rows:
 		cells = re.findall(r'<td[^<>]*?>(.+?)</td>', rowStr, re.DOTALL)
@@ -551,7 +611,7 @@ def parse_tmpg(tm, pgtxt):
 				vsSc = int(gm_mat.groups()[1])
 				hmSc = int(gm_mat.groups()[2])
 			
-			results['past'].put(
+			past_gms.append(
 				(dateInt, HorN, hmhc, hmSc, vshc, vsSc, gm_link)
 			)
 		# Save data for upcoming games
@@ -564,150 +624,78 @@ def parse_tmpg(tm, pgtxt):
 				vshc = opphc
 			# END if
 			
-			results['future'].put( (dateInt, HorN, hmhc, vshc) )
+			future_gms.append( (dateInt, HorN, hmhc, vshc) )
 		# END if
 	# END for
 	
 	return past_gms, future_gms
+# END parse_tmpg
 
 #===============================================================================
-def get_tm_schd(tm, tmhc, url, results, count, count_lock, retry=False):
-	'''doc string'''
+def get_tm_schd(tm, tmhc, url, cache=None, retry=False):
+	'''Download and parse a team's schedule page
+	
+	Args:
+		tm (str): team name, used in messages
+		tmhc (str): NCAA hashcode of the team
+		url (str): address of the team's index page
+		cache = None: urltools.ResponseCache used to revalidate the page
+		retry = False: True when this is the second download attempt
+	Returns:
+		tuple|None.  (past_gms, future_gms) as returned by parse_tmpg, None if
+			the page could not be downloaded
+	'''
 	
 	try:
 		# download team page text
-		f = urlopen(url, timeout=2*60)
-		pg_txt = f.read()
-		f.close()
+		pg_txt = urltools.fetch(url, cache=cache)
 	except URLError:
-		if not retry:
+		if not retry and (cache is None or not cache.offline):
 			print 'Retrying download of {0} schedule...'.format(tm)
-			return get_tm_schd(tm, url, results, count, count_lock, retry=True)
+			return get_tm_schd(tm, tmhc, url, cache, retry=True)
 		else:
 			print '{0} team page skipped: "{1}"'.format(tm, url)
-			with count_lock: count.value += 1
-			return
+			return None
 		# END if
 	# END try
 	
 	try:
-		rows = re.findall(r'<tr[^<>]*?>(.+?)</tr>', pg_txt, re.DOTALL)
-		for rowStr in rows:
-			cells = re.findall(r'<td[^<>]*?>(.+?)</td>', rowStr, re.DOTALL)
-			if len(cells) != 3: continue
-			
-			# Should find a date in the 1st column of the row
-			dateMat = re.search(
-				r'(?P<m> \d{2}) / (?P<d> \d{2}) / (?P<y> \d{4})',
-				cells[0], re.VERBOSE
-			)
-			if not dateMat: continue
-			
-			# Find the NCAA hashcode of other team in 2nd column
-			# of the row
-			oppMat = re.search(r'team/index.*?id=(\d+)', cells[1])
-			if oppMat:
-				opphc = oppMat.group(1)
-			else:
-				# Opponent is a non-Div I School
-				opphc = '0'
-			# END if
-			
-			# Create the game's date integer
-			dateInt = '{0[y]}{0[m]}{0[d]}'
-			dateInt = dateInt.format(dateMat.groupdict())
-			dateInt = int(dateInt)
-			
-			# Determine if the game is "H"osted or at a "N"eutral
-			# location
-			if re.search(r'<br/>@', cells[1]):
-				HorN = 'N'
-				hmhc = tmhc
-				vshc = opphc
-			elif re.search(r'@', cells[1]):
-				HorN = 'H'
-				hmhc = opphc
-				vshc = tmhc
-			else:
-				HorN = 'H'
-				hmhc = tmhc
-				vshc = opphc
-			
-			# Should find a link to the game's page in the 3rd
-			# column of the row
-			gm_mat = re.search(
-				r'''
-				<a\ href=["\']/game/index/(\d+)[^"\']*["\']>
-					[^\d<>]+ (\d+)\ *-\ *(\d+) [^<>]+
-				</a>
-				''', cells[2], re.VERBOSE
-			)
-			
-			# Save links to completed games
-			if gm_mat:
-				# Make full URL for the game
-				gm_link = (
-					'http://stats.ncaa.org/game/play_by_play/' +
-					gm_mat.groups()[0]
-				)
-				if tmhc == hmhc:
-					hmSc = int(gm_mat.groups()[1])
-					vsSc = int(gm_mat.groups()[2])
-				else:
-					vsSc = int(gm_mat.groups()[1])
-					hmSc = int(gm_mat.groups()[2])
-				
-				results['past'].put(
-					(dateInt, HorN, hmhc, hmSc, vshc, vsSc, gm_link)
-				)
-			# Save data for upcoming games
-			else:
-				if re.search(r'@', cells[1]):
-					hmhc = opphc
-					vshc = tmhc
-				else:
-					hmhc = tmhc
-					vshc = opphc
-				# END if
-				
-				results['future'].put( (dateInt, HorN, hmhc, vshc) )
-			# END if
-		# END for
+		return parse_tmpg(tmhc, pg_txt)
 	except Exception as err:
 		print '{0} on {1} page: {2}'.format(
 			type(err).__name__, tm, str(err)
 		)
 		raise err
 	# END try
-	
-	with count_lock: count.value += 1
 # END get_tm_schd
 
 #===============================================================================
-def get_gm_pbp(gm_url, gmhc, pbp_data, pbp_data_lock, count, count_lock):
+def get_gm_pbp(gm_url, gmhc):
+	'''Download and parse a game's play-by-play page
+	
+	Args:
+		gm_url (str): address of the game's play-by-play page
+		gmhc (str): hashcode of the game
+	Returns:
+		tuple|None.  (gmhc, pbp_entry), None if the page could not be
+			downloaded
+	'''
 	# Download pbp web page
 	try:
-		f = urlopen(gm_url, timeout=2*60)
-		pg_txt = f.read()
-	except URLError:
+		pg_txt = urltools.fetch(gm_url)
+	except URLError as err:
 		#if not silence:
 		print 'URLError on {0}'.format(gmhc)
 		print '    {0}'.format(gm_url)
-		print '    reason: {0}'.format(URLError.reason)
-		pg_txt = None
+		print '    reason: {0}'.format(err.reason)
+		return None
 	except Exception as err:
 		print '{0}: {1} on {2}'.format(type(err).__name__, err, gmhc)
-	finally:
-		f.close()
+		return None
 	#END try
 	
-	# Parse the pbp page and add it to the list of pbp data
-	if pg_txt is not None:
-		gm_pbp = parse_pbp_html(pg_txt, gmhc, gm_url)
-		with pbp_data_lock: pbp_data.append( (gmhc, gm_pbp) )
-	# END if
-	
-	with count_lock: count.value += 1
+	# Parse the pbp page
+	return (gmhc, parse_pbp_html(pg_txt, gmhc, gm_url))
 # END get_gm_pbp
 
 #===============================================================================
@@ -4,20 +4,44 @@
 	
 	List of classes:
 		League
+		PbpIndex
 		SeasonName
 		Team
 	List of functions:
 		pbp_data_census
 	Module dependencies: 
 		ampLib
+		mmap
 		os
 		re
+		struct
+		threading
+		zlib
 '''
 
 import os
 import re
+import mmap
+import struct
+import threading
+import zlib
 import ampLib
 
+# Column schemas of the package's csv files, for ampLib.iter_csv
+CSV_SCHEMAS = {
+	'team_hashcodes': [('Team', str), ('NCAA ID', str), ('Prime ID', int)],
+	'played_games': [
+		('gmhc', str), ('vsTm', str), ('vsSc', int), ('hmTm', str),
+		('hmSc', int), ('url', str)
+	],
+	'future_games': [('gmhc', str), ('vsTm', str), ('hmTm', str)],
+	'pbp': [
+		('period', int), ('time', str), ('vs_score', int), ('hm_score', int),
+		('team', str), ('play', str)
+	],
+	'pbp_errors': [('gmID', str)]
+}
+
 #===============================================================================
 class League(object):
 	'''College Basketball League Class
@@ -74,17 +98,17 @@ class League(object):
 		self.ncaa_hcs = []
 		self.prime_hvs = []
 		
-		f = open(file_name)
-		l = f.readline()
-		for l in f:
-			lntup = ampLib.csvline_to_list(l) # (team_name, ncaa_hc, phv)
+		for lntup in ampLib.iter_csv(
+			file_name, CSV_SCHEMAS['team_hashcodes']
+		):
+			# (team_name, ncaa_hc, phv)
 			tm = Team(*lntup)
 			
 			self.registry[tm.name] = tm
 			self.registry['n'+tm.ncaa_hc] = tm
 			self.registry['p'+str(tm.phv)] = tm
 			
-			if lntup[2] == '2':
+			if tm.phv == 2:
 				self.non_D1_name = tm.name
 			else:
 				self.tm_nms.append(tm.name)
@@ -92,7 +116,6 @@ class League(object):
 			# END if
 			self.prime_hvs.append(tm.phv)
 		# END for
-		f.close()
 		
 		self.Ntms = len(self.tm_nms)
 	
@@ -236,27 +259,433 @@ class Team(tuple):
 # END Team
 
 #===============================================================================
-def pbp_data_census(file_name):
+class PbpIndex(object):
+	'''Play-by-Play Database Byte-Offset Index Class
+	
+	Sidecar index of a pbp-xml database, kept in a binary file next to it
+	(e.g. "pbp_data_M_11-12.idx").  The file is a 24 byte header holding the
+	number of database bytes covered by the index and the CRC-32 of the last
+	indexed game entry, followed by one fixed-size record per game:
+	    (gmhc, offset, length, date, hm_phv, vs_phv, n_plays)
+	Records are read through mmap.  Opening the index only scans the part of
+	the database written after the index was last updated, and PbpWriter
+	adds a record for every game it appends.  If the last indexed entry no
+	longer matches its CRC-32 the database was rewritten, and it is indexed
+	again from the start.  The index file is only opened for writing once
+	there is a record to add, and it is not created until the database
+	exists.  Where it cannot be written the new records are kept in memory.
+	
+	Instantiation Args:
+		file_name (str): name of pbp-xml database file
+		leag = None (League): league for translating team names to prime hash
+			values, by default loaded for the season in file_name
+	Instance Attributes:
+		file_name (str)
+		idx_name (str)
+		gm_hcs (list): game hashcodes (str) in database order
+		covered (int): number of database bytes covered by the index
+	Class Methods:
+		__contains__
+		__getitem__
+		__iter__
+		__len__
+		append
+		chunks
+		close
+		read_entry
+		read_entries
+		update
+	'''
+	
+	magic = 'PBPIDX02'
+	hdr_fmt = '<8sQQ'
+	hdr_size = struct.calcsize(hdr_fmt)
+	rec_fmt = '<16sQIIIII'
+	rec_size = struct.calcsize(rec_fmt)
+	
+	def __init__(self, file_name, leag=None):
+		self.file_name = file_name
+		self.idx_name = re.sub(r'\.xml$', '', file_name) + '.idx'
+		self._leag = leag
+		self._lock = threading.RLock()
+		self._pos = {}
+		self._mm = None
+		self._idx_f = None
+		self._loaded = False
+		self._writing = False
+		self._read_only = False
+		self._n_file = 0
+		self._mem_recs = []
+		self._crc = 0
+		self.gm_hcs = []
+		self.covered = 0
+		
+		self._load()
+		self.update()
+	# END __init__
+	
+	def _load(self):
+		'''Read the existing index file, dropping any records that do not
+		agree with the database file
+		'''
+		if not os.path.exists(self.file_name): return
+		self._loaded = True
+		data_size = os.path.getsize(self.file_name)
+		
+		n_recs = 0
+		crc = 0
+		if os.path.exists(self.idx_name):
+			self._idx_f = open(self.idx_name, 'rb')
+			hdr = self._idx_f.read(self.hdr_size)
+			if len(hdr) == self.hdr_size:
+				magic, covered, crc = struct.unpack(self.hdr_fmt, hdr)
+			else:
+				magic, covered = '', 0
+			# END if
+			
+			if magic == self.magic and covered <= data_size:
+				self.covered = covered
+				idx_size = os.path.getsize(self.idx_name)
+				n_recs = (idx_size - self.hdr_size) / self.rec_size
+			# END if
+		# END if
+		
+		if n_recs > 0:
+			self._mm = mmap.mmap(
+				self._idx_f.fileno(), 0, access=mmap.ACCESS_READ
+			)
+			for i in range(n_recs):
+				rec = struct.unpack_from(
+					self.rec_fmt, self._mm, self.hdr_size + i*self.rec_size
+				)
+				# a record past the covered bytes was written by an
+				# interrupted update and will be re-indexed
+				if rec[1] + rec[2] > self.covered: break
+				self._pos[rec[0]] = len(self.gm_hcs)
+				self.gm_hcs.append(rec[0])
+				last = rec
+			# END for
+		# END if
+		
+		# the last indexed entry must be unchanged, or else the database was
+		# rewritten and the whole index is stale
+		if len(self.gm_hcs) > 0:
+			with open(self.file_name, 'rb') as f:
+				f.seek(last[1])
+				self._crc = zlib.crc32( f.read(last[2]) ) & 0xffffffff
+			# END with
+			if self._crc != crc:
+				self._pos = {}
+				self.gm_hcs = []
+				self.covered = 0
+			# END if
+		# END if
+		if len(self.gm_hcs) == 0: self._crc = 0
+		self._n_file = len(self.gm_hcs)
+	# END _load
+	
+	def _open_for_writing(self):
+		'''Reopen the index file for writing, cutting off any records that
+		were dropped when it was read
+		
+		Returns:
+			bool.  False if the index file cannot be written
+		'''
+		if self._writing: return True
+		if self._read_only: return False
+		try:
+			f = open(
+				self.idx_name,
+				'r+b' if os.path.exists(self.idx_name) else 'w+b'
+			)
+		except (IOError, OSError):
+			self._read_only = True
+			return False
+		# END try
+		
+		self._close_file()
+		self._idx_f = f
+		self._idx_f.truncate(self.hdr_size + self._n_file*self.rec_size)
+		self._write_header()
+		self._writing = True
+		return True
+	# END _open_for_writing
+	
+	def _close_file(self):
+		if self._mm is not None: self._mm.close()
+		if self._idx_f is not None: self._idx_f.close()
+		self._mm = None
+		self._idx_f = None
+		self._writing = False
+	# END _close_file
+	
+	def _write_header(self):
+		self._idx_f.seek(0)
+		self._idx_f.write(
+			struct.pack(self.hdr_fmt, self.magic, self.covered, self._crc)
+		)
+	# END _write_header
+	
+	def _record(self, i):
+		if i >= self._n_file:
+			return struct.unpack(self.rec_fmt, self._mem_recs[i-self._n_file])
+		# END if
+		end = self.hdr_size + (i+1)*self.rec_size
+		if self._mm is None or len(self._mm) < end:
+			if self._mm is not None: self._mm.close()
+			self._mm = mmap.mmap(
+				self._idx_f.fileno(), 0, access=mmap.ACCESS_READ
+			)
+		# END if
+		
+		return struct.unpack_from(
+			self.rec_fmt, self._mm, self.hdr_size + i*self.rec_size
+		)
+	# END _record
+	
+	def _team_phv(self, name):
+		if self._leag is None:
+			gy = re.search(
+				r'pbp_data_(M|W)_(\d\d)-\d\d\.xml$', self.file_name
+			).groups()
+			self._leag = League( SeasonName(gy[0], '20'+gy[1]) )
+		# END if
+		
+		return self._leag(name).phv
+	# END _team_phv
+	
+	def _add(self, gmhc, offset, lines):
+		'''Append the record of a game entry to the index
+		
+		Args:
+			gmhc (str): game hashcode
+			offset (int): byte offset of the entry in the database
+			lines (list): the entry's lines, each ending in a newline
+		'''
+		hm_nm = ''
+		vs_nm = ''
+		n_csv = 0
+		for ln in lines:
+			if ln[0] != '<':
+				# blank lines are not plays, as in the loaders
+				if ln != '\n': n_csv += 1
+			elif ln.startswith('<home>'):
+				hm_nm = ln[6:ln.index('<', 6)]
+			elif ln.startswith('<visitor>'):
+				vs_nm = ln[9:ln.index('<', 9)]
+			# END if
+		# END for
+		length = sum(len(ln) for ln in lines)
+		
+		rec = struct.pack(
+			self.rec_fmt, gmhc, offset, length, int(gmhc[:8]),
+			self._team_phv(hm_nm), self._team_phv(vs_nm), max(n_csv-1, 0)
+		)
+		writing = self._open_for_writing()
+		self.covered = offset + length
+		self._crc = zlib.crc32( ''.join(lines) ) & 0xffffffff
+		if writing:
+			self._idx_f.seek(0, 2)
+			self._idx_f.write(rec)
+			self._n_file += 1
+			self._write_header()
+			self._idx_f.flush()
+		else:
+			self._mem_recs.append(rec)
+		# END if
+		
+		self._pos[gmhc] = len(self.gm_hcs)
+		self.gm_hcs.append(gmhc)
+	# END _add
+	
+	def update(self):
+		'''Index any games written to the database after the covered bytes
+		
+		Args: -none-
+		Returns:
+			int.  Number of games added to the index
+		'''
+		if not os.path.exists(self.file_name): return 0
+		
+		n_0 = len(self.gm_hcs)
+		with self._lock:
+			if not self._loaded: self._load()
+			with open(self.file_name, 'rb') as f:
+				f.seek(self.covered)
+				pos = self.covered
+				lines = None
+				while True:
+					ln = f.readline()
+					if not ln.endswith('\n'): break
+					if ln.startswith('<game id="'):
+						gmhc = ln[10:ln.index('"', 10)]
+						start = pos
+						lines = []
+					# END if
+					pos += len(ln)
+					if lines is None:
+						# stray text between entries
+						if not ln.strip(): self.covered = pos
+						continue
+					# END if
+					
+					lines.append(ln)
+					if ln == '</game>\n':
+						self._add(gmhc, start, lines)
+						lines = None
+					# END if
+				# END while
+			# END with
+		# END with
+		
+		return len(self.gm_hcs) - n_0
+	# END update
+	
+	def append(self, gmhc, offset, entry):
+		'''Index a game entry that was just appended to the database
+		
+		Args:
+			gmhc (str): game hashcode
+			offset (int): byte offset the entry was written at
+			entry (str): text of the entry, including its final newline
+		Returns: -none-
+		'''
+		with self._lock:
+			if not self._loaded: self._load()
+			if offset != self.covered:
+				# the database was changed by someone else in the meantime
+				self.update()
+			else:
+				self._add(gmhc, offset, entry.splitlines(True))
+			# END if
+		# END with
+	# END append
+	
+	def close(self):
+		'''Close the index file and its memory map
+		
+		Args: -none-
+		Returns: -none-
+		'''
+		with self._lock:
+			self._close_file()
+		# END with
+	# END close
+	
+	def __contains__(self, gmhc):
+		return gmhc in self._pos
+	# END __contains__
+	
+	def __getitem__(self, gmhc):
+		'''Look up a game's record
+		
+		Args:
+			gmhc (str): game hashcode
+		Returns:
+			tuple.  (offset, length, date, hm_phv, vs_phv, n_plays)
+		'''
+		with self._lock:
+			return self._record(self._pos[gmhc])[1:]
+		# END with
+	# END __getitem__
+	
+	def __iter__(self):
+		return iter(list(self.gm_hcs))
+	# END __iter__
+	
+	def __len__(self):
+		return len(self.gm_hcs)
+	# END __len__
+	
+	def chunks(self, n_chunks):
+		'''Split the database into byte ranges holding whole game entries
+		
+		Args:
+			n_chunks (int): number of ranges wanted
+		Returns:
+			list.  [(start, stop), ...] byte offsets in database order, at most
+				n_chunks of them with about equal sizes
+		'''
+		with self._lock:
+			recs = [self._record(i) for i in range(len(self.gm_hcs))]
+		# END with
+		if len(recs) == 0: return []
+		
+		target = float(recs[-1][1] + recs[-1][2] - recs[0][1]) / n_chunks
+		bounds = []
+		start = recs[0][1]
+		for rec in recs:
+			stop = rec[1] + rec[2]
+			if stop - start >= target:
+				bounds.append( (start, stop) )
+				start = stop
+			# END if
+		# END for
+		if start < stop: bounds.append( (start, stop) )
+		
+		return bounds
+	# END chunks
+	
+	def read_entry(self, gmhc):
+		'''Read a single game's entry out of the database
+		
+		Args:
+			gmhc (str): game hashcode
+		Returns:
+			str.  Text of the game's entry
+		'''
+		offset, length = self[gmhc][:2]
+		with open(self.file_name, 'rb') as f:
+			f.seek(offset)
+			return f.read(length)
+		# END with
+	# END read_entry
+	
+	def read_entries(self, gm_hcs):
+		'''Read several games' entries out of the database in file order
+		
+		Args:
+			gm_hcs (list): game hashcodes (str)
+		Yields:
+			(gmhc, entry_text)
+		'''
+		locs = sorted( (self[gmhc][:2], gmhc) for gmhc in gm_hcs )
+		with open(self.file_name, 'rb') as f:
+			for ((offset, length), gmhc) in locs:
+				f.seek(offset)
+				yield (gmhc, f.read(length))
+			# END for
+		# END with
+	# END read_entries
+# END PbpIndex
+
+#===============================================================================
+def pbp_data_census(file_name, leag=None):
 	'''Play-by-Play Quick Data Census
 	
 	This function will count up which games are recorded in a pbp-xml database
-	without loading the whole database into memory
+	without loading the whole database into memory.  Given a League it goes
+	by way of the database's PbpIndex, otherwise the database is scanned for
+	game entries.
 	
 	Args:
 		file_name (str): name of pbp-xml database file
+		leag = None (League): league of the database's season
 	Returns:
 		list. List of indiviual game hashcodes (str)
 	'''
-	gm_hashcodes = []
-	
-	if file_name not in os.listdir('.'): return gm_hashcodes
+	if not os.path.exists(file_name): return []
+	if leag is not None:
+		pbp_index = PbpIndex(file_name, leag)
+		pbp_index.close()
+		return list(pbp_index)
+	# END if
 	
-	lnptn = re.compile(r'^<game\ id="([\dHN]{16})">$')
+	gm_hashcodes = []
 	with open(file_name) as f:
 		for ln in f:
-			lnMat = lnptn.match(ln)
-			if lnMat:
-				gm_hashcodes.append( lnMat.group(1) )
+			if ln.startswith('<game id="') and ln.endswith('">\n'):
+				gm_hashcodes.append( ln[10:-3] )
 			# END if
 		# END for
 	# END with
@@ -6,16 +6,53 @@
 	List of Functions:
 		main
 		link_collection
+		download_pbp
+		iter_gm
+		crawl_engine
+		http_cache
+		loader_benchmark
+		bout_benchmark
+		add_game
+		predict_site
+		bootstrap_ranks
+		csv_benchmark
 	Module dependencies: 
+		ampLib
+		analysis
+		BaseHTTPServer
 		collection
-		sys
+		core
+		cStringIO
+		gzip
+		numpy
+		os
+		re
+		shutil
+		SocketServer
+		tempfile
+		threading
+		time
+		urltools
 '''
 
 import core
+import ampLib
 import collection as coll
 import analysis as anl
+import urltools
 
+import numpy as np
+
+import os
 import re
+import time
+import gzip
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+from cStringIO import StringIO
+import SocketServer
 
 test_sn = core.SeasonName('M', 2011)
 
@@ -24,7 +61,15 @@ def main(*args):
 	test_lut = {
 		'link_collection': link_collection,
 		'download_pbp': download_pbp,
-		'iter_gm': iter_gm
+		'iter_gm': iter_gm,
+		'crawl_engine': crawl_engine,
+		'http_cache': http_cache,
+		'loader_benchmark': loader_benchmark,
+		'bout_benchmark': bout_benchmark,
+		'add_game': add_game,
+		'predict_site': predict_site,
+		'bootstrap_ranks': bootstrap_ranks,
+		'csv_benchmark': csv_benchmark
 	}
 	test_lut[args[0]]()
 # END main
@@ -65,6 +110,476 @@ def iter_gm():
 	# END with
 # END load_sample_game
 
+#===============================================================================
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	'''Local stand-in for stats.ncaa.org
+	
+	Serves a canned team index page for "/team/index/..." and a canned
+	play-by-play page for "/game/play_by_play/..." after a short delay over
+	keep-alive HTTP/1.1, gzip compressed when the client asks for it.  Team
+	pages carry an ETag and are answered with "304 Not Modified" when the
+	client already has them, except for the pages listed in srv.changed.  It
+	keeps track of the most requests it had open at once, the number of
+	connections and the number of body bytes sent.
+	'''
+	
+	daemon_threads = True
+	
+	tm_pg = (
+		'<table>\n<tr><td>11/12/2011</td>'
+		+ '<td><a href="/team/index/10740?org_id=1">Elon</a></td>'
+		+ '<td><a href="/game/index/{0}?org_id=2">W 80 - 70 </a></td></tr>\n'
+		+ '<tr><td>03/01/2012</td>'
+		+ '<td>@ <a href="/team/index/10740?org_id=3">Duke</a></td>'
+		+ '<td>TBA</td></tr>\n</table>'
+	)
+	gm_pg = (
+		'<table class="mytable"><tr class="heading"><td>Team</td>'
+		+ '<td>Total</td></tr>\n<tr><td>Elon</td><td>70</td></tr>\n'
+		+ '<tr><td>North Carolina St.</td><td>80</td></tr></table>\n'
+		+ 2*(
+			'<table class="mytable"><tr class="heading"><td>Time</td>'
+			+ '<td>Elon</td><td>Score</td><td>North Carolina St.</td></tr>\n'
+			+ '<tr><td>19:40</td><td>made Layup</td><td>2-0</td>'
+			+ '<td></td></tr>\n</table>\n'
+		)
+	)
+	
+	def __init__(self, delay=0.05):
+		BaseHTTPServer.HTTPServer.__init__(
+			self, ('127.0.0.1', 0), StandInHandler
+		)
+		self.delay = delay
+		self.lock = threading.Lock()
+		self.n_open = 0
+		self.max_open = 0
+		self.n_served = 0
+		self.n_connections = 0
+		self.n_bytes = 0
+		self.changed = set()
+	# END __init__
+	
+	@property
+	def base_url(self):
+		return 'http://127.0.0.1:{0}'.format(self.server_address[1])
+	# END base_url
+	
+	def start(self):
+		t = threading.Thread(target=self.serve_forever)
+		t.daemon = True
+		t.start()
+	# END start
+# END StandInServer
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	
+	def setup(self):
+		BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+		with self.server.lock: self.server.n_connections += 1
+	# END setup
+	
+	def do_GET(self):
+		srv = self.server
+		with srv.lock:
+			srv.n_open += 1
+			srv.max_open = max(srv.max_open, srv.n_open)
+		# END with
+		time.sleep(srv.delay)
+		
+		gm_num = re.search(r'(\d+)$', self.path.split('?')[0]).group(1)
+		etag = None
+		if self.path.startswith('/team/'):
+			body = srv.tm_pg.format(gm_num)
+			etag = '"{0}-{1}"'.format(gm_num, gm_num in srv.changed)
+		else:
+			body = srv.gm_pg
+		# END if
+		
+		if etag is not None and self.headers.get('If-None-Match') == etag:
+			self.send_response(304)
+			self.send_header('ETag', etag)
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			with srv.lock:
+				srv.n_open -= 1
+				srv.n_served += 1
+			# END with
+			return
+		# END if
+		
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/html')
+		if etag is not None: self.send_header('ETag', etag)
+		if 'gzip' in self.headers.get('Accept-Encoding', ''):
+			buf = StringIO()
+			with gzip.GzipFile(fileobj=buf, mode='wb') as gz: gz.write(body)
+			body = buf.getvalue()
+			self.send_header('Content-Encoding', 'gzip')
+		# END if
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+		
+		with srv.lock:
+			srv.n_open -= 1
+			srv.n_served += 1
+			srv.n_bytes += len(body)
+		# END with
+	# END do_GET
+	
+	def log_message(self, *args): pass
+# END StandInHandler
+
+#===============================================================================
+def crawl_engine(n_pgs=200, max_inflight=16):
+	'''Crawl team and pbp pages from a local stand-in server
+	'''
+	srv = StandInServer()
+	srv.start()
+	urltools.get_client().close()
+	
+	tm_tasks = [
+		('Team{0}'.format(i), str(i), srv.base_url+'/team/index/{0}'.format(i))
+		for i in range(n_pgs)
+	]
+	t_0 = time.time()
+	schds = urltools.crawl(
+		coll.get_tm_schd, tm_tasks, max_inflight=max_inflight, silence=True
+	)
+	t_tm = time.time() - t_0
+	
+	gm_tasks = []
+	for past_gms, future_gms in schds:
+		assert len(past_gms) == 1 and len(future_gms) == 1
+		gm_url = re.sub(r'^http://[^/]+', srv.base_url, past_gms[0][6])
+		gm_tasks.append( (gm_url, '20111112H{0:07d}'.format(len(gm_tasks))) )
+	# END for
+	t_0 = time.time()
+	entries = urltools.crawl(
+		coll.get_gm_pbp, gm_tasks, max_inflight=max_inflight, silence=True
+	)
+	t_gm = time.time() - t_0
+	
+	for (gmhc, entry) in entries:
+		assert entry.startswith('<game id="{0}">'.format(gmhc))
+		assert '<home>North Carolina St.</home>' in entry
+	# END for
+	assert srv.n_served == 2*n_pgs
+	assert srv.max_open <= max_inflight
+	assert srv.n_connections <= max_inflight
+	
+	print '{0} team pages in {1:0.2f} s'.format(n_pgs, t_tm)
+	print '{0} pbp pages in {1:0.2f} s'.format(n_pgs, t_gm)
+	print 'at most {0} requests in flight (limit {1})'.format(
+		srv.max_open, max_inflight
+	)
+	print '{0} connections opened, {1} body bytes received'.format(
+		srv.n_connections, srv.n_bytes
+	)
+	urltools.get_client().close()
+	srv.shutdown()
+# END crawl_engine
+
+#===============================================================================
+def http_cache(n_pgs=200, n_changed=5):
+	'''Crawl team pages from a local stand-in server through the on-disk cache
+	three times: cold, revalidated with a few changed pages, and offline
+	'''
+	srv = StandInServer(delay=0.0)
+	srv.start()
+	urltools.get_client().close()
+	cache_dir = tempfile.mkdtemp()
+	
+	def crawl_tm_pgs(cache):
+		tm_tasks = [
+			(
+				'Team{0}'.format(i), str(i),
+				srv.base_url+'/team/index/{0}'.format(i), cache
+			)
+			for i in range(n_pgs)
+		]
+		n_bytes = srv.n_bytes
+		schds = urltools.crawl(coll.get_tm_schd, tm_tasks, silence=True)
+		for schd in schds: assert len(schd[0]) == 1
+		return srv.n_bytes - n_bytes
+	# END crawl_tm_pgs
+	
+	try:
+		cache = urltools.ResponseCache(cache_dir)
+		print 'cold crawl: {0} bytes'.format( crawl_tm_pgs(cache) )
+		assert cache.n_misses == n_pgs
+		
+		srv.changed = set( str(i) for i in range(n_changed) )
+		cache = urltools.ResponseCache(cache_dir)
+		print 'revalidating crawl: {0} bytes'.format( crawl_tm_pgs(cache) )
+		assert cache.n_misses == n_changed
+		assert cache.n_hits == n_pgs - n_changed
+		
+		n_served = srv.n_served
+		cache = urltools.ResponseCache(cache_dir, offline=True)
+		crawl_tm_pgs(cache)
+		assert srv.n_served == n_served
+		assert cache.n_hits == n_pgs
+		print 'offline crawl: 0 requests'
+		
+		cache = urltools.ResponseCache(cache_dir, max_bytes=0)
+		assert cache.evict() == n_pgs
+		assert len(os.listdir(cache_dir)) == 0
+	finally:
+		urltools.get_client().close()
+		srv.shutdown()
+		shutil.rmtree(cache_dir)
+	# END try
+# END http_cache
+
+#===============================================================================
+class _BaselineGame(object):
+	'''Game as it was built before the single-pass loader, kept to time the
+	original loading path
+	'''
+	
+	def __init__(self, hashcode, hm, vs, pbp_csv):
+		self.hc = hashcode
+		self.teams = {'hm': hm, hm.name: hm, 'vs': vs, vs.name: vs}
+		self.plays = []
+		
+		csv_lns = re.findall(r'[^\n]+?\n', pbp_csv)
+		if len(csv_lns) < 2:
+			raise anl.EmptyGameError(hashcode, hm.name, vs.name)
+		# END if
+		
+		self.plays_keys = ampLib.csvline_to_list(csv_lns.pop(0))
+		for ln in csv_lns:
+			ln = ampLib.csvline_to_list(ln)
+			self.plays.append(
+				(
+					int(ln[0]), ln[1], int(ln[2]), int(ln[3]),
+					self.teams.get(ln[4]), ln[5]
+				)
+			)
+		# END for
+	# END __init__
+# END _BaselineGame
+
+def _baseline_load(file_name):
+	'''The original SeasonData loading loop: whole-game string building, a
+	regex per tag line, team look-ups and a _BaselineGame per game
+	
+	Returns:
+		dict.  _BaselineGame objects keyed by game hashcode
+	'''
+	gy = re.search(r'pbp_data_(M|W)_(\d\d)-\d\d\.xml$', file_name).groups()
+	leag = core.League( core.SeasonName(gy[0], '20'+gy[1]) )
+	
+	gms = {}
+	with open(file_name) as f:
+		pbp_csv = ''
+		for ln in f:
+			if ln[0] != '<':
+				pbp_csv += ln
+			elif ln[1] == 'g':
+				gmhc = re.search(r'^<game id="([^"]+)">', ln).group(1)
+			elif ln[1] == 'h':
+				hm_nm = re.search(r'^<home>([^<>]+)', ln).group(1)
+			elif ln[1] == 'v':
+				vs_nm = re.search(r'^<visitor>([^<>]+)', ln).group(1)
+			elif ln == '</game>\n':
+				try:
+					gms[gmhc] = _BaselineGame(
+						gmhc, leag(hm_nm), leag(vs_nm), pbp_csv
+					)
+				except anl.EmptyGameError:
+					pass
+				# END try
+				pbp_csv = ''
+			# END if
+		# END for
+	# END with
+	
+	return gms
+# END _baseline_load
+
+def loader_benchmark(file_name='pbp_data_{0}.xml'.format(test_sn)):
+	'''Compare plays/second of the original SeasonData loading path with the
+	single-pass loader, and check that they read the same plays
+	'''
+	t_0 = time.time()
+	old_gms = _baseline_load(file_name)
+	t_old = time.time() - t_0
+	
+	t_0 = time.time()
+	sd = anl.SeasonData(file_name)
+	t_new = time.time() - t_0
+	
+	n_plays = 0
+	for gm in sd:
+		old_plays = old_gms[gm.hc].plays
+		assert [ply[:4] + ply[5:] for ply in gm.plays] == [
+			ply[:4] + ply[5:] for ply in old_plays
+		]
+		assert [
+			(None if ply[4] is None else ply[4].name) for ply in gm.plays
+		] == [(None if ply[4] is None else ply[4].name) for ply in old_plays]
+		n_plays += len(gm.plays)
+	# END for
+	assert len(sd.gm_hcs) == len(old_gms)
+	
+	print '{0} games, {1} plays'.format(len(sd.gm_hcs), n_plays)
+	print 'original SeasonData: {0:10.0f} plays/s'.format(n_plays/t_old)
+	print 'SeasonData loader:   {0:10.0f} plays/s'.format(n_plays/t_new)
+# END loader_benchmark
+
+#===============================================================================
+def bout_benchmark(file_name='pbp_data_{0}.xml'.format(test_sn)):
+	'''Time splitting every game of a season into bouts, for the first time
+	(plays being classified) and once the play types are cached
+	'''
+	sd = anl.SeasonData(file_name)
+	for i in range(2):
+		t_0 = time.time()
+		n_bouts = 0
+		n_commonfouls = 0
+		for gm in sd:
+			for bout in gm:
+				n_bouts += 1
+				if bout.includes_commonfoul: n_commonfouls += 1
+			# END for
+		# END for
+		t = time.time() - t_0
+		print '{0} pass: {1} bouts ({2} common fouls), {3:.0f} bouts/s'.format(
+			('1st', '2nd')[i], n_bouts, n_commonfouls, n_bouts/t
+		)
+	# END for
+# END bout_benchmark
+
+#===============================================================================
+def add_game(file_name='pbp_data_{0}.xml'.format(test_sn)):
+	'''Add a game to a season loaded fully and lazily, and find it through
+	the season's indexes
+	'''
+	full = anl.SeasonData(file_name)
+	gm = full.gms[full.gm_hcs[0]]
+	for lazy in (False, True):
+		sd = anl.SeasonData(file_name, gm_hcs=full.gm_hcs[1:], lazy=lazy)
+		assert gm.hc not in sd.gm_hcs
+		sd.add_game(gm)
+		assert sd.gm_hcs == full.gm_hcs
+		assert sd.gms[gm.hc] is gm
+		assert gm in sd.get_tm_schd(gm.hm)
+		assert gm in sd.get_h2h_gms(gm.hm, gm.vs)
+		assert gm in sd.get_date_gms(gm.hc[:8])
+		print 'add_game (lazy={0}) OK'.format(lazy)
+	# END for
+# END add_game
+
+#===============================================================================
+def predict_site():
+	'''Check that game predictions favor the home team of a hosted game,
+	with win probabilities agreeing with the expected margins
+	'''
+	(pHm, pnts) = anl.predictGm(1.0, 1.0, 'N', 'M')
+	assert pHm == 0.5 and pnts == 0.0
+	(pHm, pnts) = anl.predictGm(1.0, 1.0, 'H', 'M')
+	assert pHm > 0.5 and pnts > 0.0
+	
+	(P, margins) = anl.predictAllPairs([1.2, 1.0, 0.7], 'H', 'W')
+	assert ((P > 0.5) == (margins > 0)).all()
+	assert np.allclose(anl.valueGms(margins, 'N', 'W')[0], P)
+	print 'home win probability {0:.3f}, margin {1:+.2f}: OK'.format(
+		pHm, pnts
+	)
+# END predict_site
+
+#===============================================================================
+def bootstrap_ranks():
+	'''Check the ranking of bootstrap replicates, with a team left out of a
+	replicate ranked after all the others
+	'''
+	repVs = np.array([
+		[1.276, 0.364, 0.68, np.nan],
+		[0.5, 0.9, 0.7, 1.1]
+	])
+	repRnks = anl._replicate_ranks(repVs)
+	assert repRnks[0, :3].tolist() == [1, 3, 2]
+	assert np.isnan(repRnks[0, 3])
+	assert repRnks[1].tolist() == [4, 2, 3, 1]
+	print 'bootstrap replicate ranks OK'
+	
+	# a team with one game is left out of some resampled seasons entirely
+	leag = core.League(test_sn)
+	(A, B, C, D) = leag.tm_nms[:4]
+	boxData = [
+		{'gmID': '2011120{0}H0000001'.format(i), 'home': hm, 'hmSc': 70+i,
+			'visitor': vs, 'vsSc': 68}
+		for (i, (hm, vs)) in enumerate([(A, B), (B, C), (C, A), (A, C)])
+	] + [{
+		'gmID': '20111209H0000002', 'home': D, 'hmSc': 60, 'visitor': A,
+		'vsSc': 65
+	}]
+	n_left_out = 0
+	for seed in range(20):
+		for (rnkd, vPcts, rnkPcts) in anl.rwBootstrap(
+			boxData, leag=leag, n_reps=2, procs=1, seed=seed
+		):
+			if rnkd.tm != D: continue
+			if rnkPcts == (None, None, None):
+				assert np.isnan(vPcts).all()
+				n_left_out += 1
+			# END if
+		# END for
+	# END for
+	assert n_left_out > 0
+	print 'bootstrap of a team with one game OK'
+# END bootstrap_ranks
+
+#===============================================================================
+def csv_benchmark(file_name='pbp_data_{0}.xml'.format(test_sn)):
+	'''Compare rows/second of ampLib.csvline_to_list with ampLib.iter_csv on
+	the played games file and on the csv lines of a pbp-xml database, and
+	check that they read the same values
+	'''
+	pbp_lns = ['period,time,vs_score,hm_score,team,play\n']
+	with open(file_name) as f:
+		for ln in f:
+			if ln[0] != '<' and ln != '\n' and not ln.startswith('period,'):
+				pbp_lns.append(ln)
+			# END if
+		# END for
+	# END with
+	with open('played_games_{0}.csv'.format(test_sn)) as f:
+		played_lns = f.readlines()
+	# END with
+	
+	for (nm, lns, schema) in [
+		('played games', played_lns, core.CSV_SCHEMAS['played_games']),
+		('pbp', pbp_lns, core.CSV_SCHEMAS['pbp'])
+	]:
+		convs = [typ for (col, typ) in schema]
+		t_0 = time.time()
+		old_rows = [
+			tuple( conv(v) for (conv, v) in
+				zip(convs, ampLib.csvline_to_list(ln))
+			)
+			for ln in lns[1:]
+		]
+		t_old = time.time() - t_0
+		
+		t_0 = time.time()
+		new_rows = list( ampLib.iter_csv(lns, schema) )
+		t_new = time.time() - t_0
+		
+		assert new_rows == old_rows
+		print '{0} ({1} rows)'.format(nm, len(new_rows))
+		print '    csvline_to_list:  {0:10.0f} rows/s'.format(
+			len(old_rows)/t_old
+		)
+		print '    iter_csv:         {0:10.0f} rows/s'.format(
+			len(new_rows)/t_new
+		)
+	# END for
+# END csv_benchmark
+
 #===============================================================================
 if __name__ == '__main__':
 	import sys
@@ -0,0 +1,618 @@
+'''URL Fetching and Crawling Tools Module
+	Author: Alex Pronschinske
+	Version: 1 (developmental)
+	
+	List of Classes:
+		Counter
+		HTTPClient
+		Response
+		ResponseCache
+	List of Functions:
+		crawl
+		fetch
+		get_client
+	Module dependencies:
+		ampLib
+		hashlib
+		httplib
+		json
+		os
+		Queue
+		socket
+		threading
+		time
+		urllib2
+		urlparse
+		zlib
+'''
+
+import os
+import time
+import json
+import hashlib
+import Queue
+import threading
+import httplib
+import socket
+import zlib
+from urlparse import urlsplit, urljoin
+from urllib2 import URLError, HTTPError
+import ampLib
+
+#===============================================================================
+class Counter(object):
+	'''Thread-Safe Progress Counter Class
+	
+	Stand-in for the multiprocessing.Manager Value/Lock pair so that
+	ampLib.update can report progress on work done by threads
+	
+	Instantiation Args: -none-
+	Instance Attributes:
+		value (int)
+		lock (threading.Lock)
+	Class Methods:
+		increment
+	'''
+	
+	def __init__(self):
+		self.value = 0
+		self.lock = threading.Lock()
+	# END __init__
+	
+	def increment(self):
+		with self.lock: self.value += 1
+	# END increment
+# END Counter
+
+#===============================================================================
+class Response(object):
+	'''HTTP Response Class
+	
+	Instantiation Args:
+		url (str): address that was finally answered, after any redirects
+		status (int): HTTP status code
+		reason (str): HTTP status message
+		headers (dict): response headers keyed by lower-case name
+		body (str): decoded response body
+	Instance Attributes:
+		url (str)
+		status (int)
+		reason (str)
+		headers (dict)
+		body (str)
+		n_bytes (int): number of body bytes that came over the wire
+	'''
+	
+	def __init__(self, url, status, reason, headers, body, n_bytes=0):
+		self.url = url
+		self.status = status
+		self.reason = reason
+		self.headers = headers
+		self.body = body
+		self.n_bytes = n_bytes
+	# END __init__
+# END Response
+
+#===============================================================================
+class HTTPClient(object):
+	'''Pooled Keep-Alive HTTP Client Class
+	
+	Keeps a pool of idle persistent connections for every host so that
+	successive requests skip the TCP handshake, asks servers for gzip/deflate
+	transfer encoding, and decompresses bodies chunk by chunk as they are read.
+	The client is thread-safe; one instance is meant to be shared by every
+	worker of a crawl.
+	
+	Instantiation Args:
+		connect_timeout = 15: seconds allowed for opening a connection
+		read_timeout = 60: seconds allowed between bytes of a response
+		max_idle = 20: maximum number of idle connections kept per host
+		user_agent = 'cbb': User-Agent header value
+	Instance Attributes:
+		connect_timeout (float)
+		read_timeout (float)
+		max_idle (int)
+		user_agent (str)
+		n_connections (int): number of connections opened so far
+		n_requests (int): number of requests sent so far
+	Class Methods:
+		get
+		close
+	'''
+	
+	chunk_size = 64*1024
+	max_redirects = 5
+	
+	def __init__(
+		self, connect_timeout=15, read_timeout=60, max_idle=20, user_agent='cbb'
+	):
+		self.connect_timeout = connect_timeout
+		self.read_timeout = read_timeout
+		self.max_idle = max_idle
+		self.user_agent = user_agent
+		self.n_connections = 0
+		self.n_requests = 0
+		self._pools = {}
+		self._lock = threading.Lock()
+	# END __init__
+	
+	def _acquire(self, host_key):
+		with self._lock:
+			pool = self._pools.get(host_key)
+			if pool: return pool.pop(), True
+			self.n_connections += 1
+		# END with
+		
+		scheme, host, port = host_key
+		if scheme == 'https':
+			conn = httplib.HTTPSConnection(
+				host, port, timeout=self.connect_timeout
+			)
+		else:
+			conn = httplib.HTTPConnection(
+				host, port, timeout=self.connect_timeout
+			)
+		# END if
+		try:
+			conn.connect()
+		except socket.error as err:
+			raise URLError(err)
+		# END try
+		conn.sock.settimeout(self.read_timeout)
+		
+		return conn, False
+	# END _acquire
+	
+	def _release(self, host_key, conn):
+		with self._lock:
+			pool = self._pools.setdefault(host_key, [])
+			if len(pool) < self.max_idle:
+				pool.append(conn)
+				return
+			# END if
+		# END with
+		conn.close()
+	# END _release
+	
+	def _read_body(self, resp):
+		'''Read and decompress a response body as it streams in
+		'''
+		encoding = (resp.getheader('content-encoding') or '').lower()
+		if encoding == 'gzip':
+			decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+		elif encoding == 'deflate':
+			decoder = zlib.decompressobj()
+		else:
+			decoder = None
+		# END if
+		
+		chunks = []
+		n_bytes = 0
+		while True:
+			chunk = resp.read(self.chunk_size)
+			if not chunk: break
+			n_bytes += len(chunk)
+			if decoder is None:
+				chunks.append(chunk)
+				continue
+			# END if
+			
+			try:
+				chunks.append( decoder.decompress(chunk) )
+			except zlib.error:
+				if encoding != 'deflate' or n_bytes != len(chunk): raise
+				# Some servers send raw deflate data without the zlib header
+				decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+				chunks.append( decoder.decompress(chunk) )
+			# END try
+		# END while
+		if decoder is not None: chunks.append( decoder.flush() )
+		
+		return ''.join(chunks), n_bytes
+	# END _read_body
+	
+	def _request(self, url, headers):
+		parts = urlsplit(url)
+		scheme = parts.scheme or 'http'
+		port = parts.port or (443 if scheme == 'https' else 80)
+		host_key = (scheme, parts.hostname, port)
+		path = parts.path or '/'
+		if parts.query: path += '?' + parts.query
+		
+		req_headers = {
+			'Accept-Encoding': 'gzip, deflate',
+			'Connection': 'keep-alive',
+			'User-Agent': self.user_agent,
+		}
+		req_headers.update(headers)
+		
+		# A pooled connection may have been closed by the server while it sat
+		# idle, in which case the request is retried once on a new connection
+		for attempt in range(2):
+			conn, reused = self._acquire(host_key)
+			try:
+				conn.request('GET', path, headers=req_headers)
+				resp = conn.getresponse()
+				body, n_bytes = self._read_body(resp)
+			except (httplib.HTTPException, socket.error) as err:
+				conn.close()
+				if reused and attempt == 0: continue
+				raise URLError(err)
+			except zlib.error as err:
+				# a corrupt body, retrying on a new connection will not help
+				conn.close()
+				raise URLError(err)
+			except:
+				conn.close()
+				raise
+			# END try
+			break
+		# END for
+		with self._lock: self.n_requests += 1
+		
+		resp_headers = dict(resp.getheaders())
+		if resp.will_close:
+			conn.close()
+		else:
+			self._release(host_key, conn)
+		# END if
+		
+		return Response(
+			url, resp.status, resp.reason, resp_headers, body, n_bytes
+		)
+	# END _request
+	
+	def get(self, url, headers=None):
+		'''Send a GET request, following redirects
+		
+		Args:
+			url (str): address of the resource
+			headers = None: dict of extra request headers
+		Returns:
+			Response.
+		'''
+		if headers is None: headers = {}
+		
+		for _ in range(self.max_redirects + 1):
+			resp = self._request(url, headers)
+			redirected = resp.status in (301, 302, 303, 307)
+			if redirected and 'location' in resp.headers:
+				url = urljoin(url, resp.headers['location'])
+				continue
+			# END if
+			return resp
+		# END for
+		
+		raise URLError('too many redirects from "{0}"'.format(url))
+	# END get
+	
+	def close(self):
+		'''Close all idle connections
+		'''
+		with self._lock:
+			for pool in self._pools.values():
+				for conn in pool: conn.close()
+			# END for
+			self._pools = {}
+		# END with
+	# END close
+# END HTTPClient
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+#===============================================================================
+def get_client():
+	'''Get the HTTPClient shared by all of the package's downloads
+	
+	Args: -none-
+	Returns:
+		HTTPClient.
+	'''
+	global _default_client
+	with _default_client_lock:
+		if _default_client is None: _default_client = HTTPClient()
+	# END with
+	
+	return _default_client
+# END get_client
+
+#===============================================================================
+class ResponseCache(object):
+	'''On-Disk HTTP Response Cache Class
+	
+	Stores page bodies keyed by URL together with the ETag and Last-Modified
+	validators the server sent, so that later downloads of the same page can
+	be made as conditional requests and cost nothing when the page has not
+	changed.  Every URL gets a "<sha1>.body" file and a "<sha1>.meta" JSON
+	file in cache_dir; the modification time of the body file records when
+	the entry was last confirmed fresh and drives eviction.
+	
+	Instantiation Args:
+		cache_dir = 'http_cache': directory holding the cache files
+		max_bytes = 500*2**20: total body size kept by evict
+		max_age = 60*24*60*60: seconds an unconfirmed entry is kept by evict
+		offline = False: if True fetches are answered from the cache only
+	Instance Attributes:
+		cache_dir (str)
+		max_bytes (int)
+		max_age (float)
+		offline (bool)
+		n_hits (int): requests answered without downloading a body
+		n_misses (int): requests that downloaded a body
+	Class Methods:
+		lookup
+		store
+		touch
+		evict
+	'''
+	
+	def __init__(
+		self, cache_dir='http_cache', max_bytes=500*2**20,
+		max_age=60*24*60*60, offline=False
+	):
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.max_age = max_age
+		self.offline = offline
+		self.n_hits = 0
+		self.n_misses = 0
+		self._lock = threading.Lock()
+		if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+	# END __init__
+	
+	def _path(self, url, ext):
+		key = hashlib.sha1(url).hexdigest()
+		return os.path.join(self.cache_dir, key + ext)
+	# END _path
+	
+	def _write(self, file_name, txt):
+		# write-then-rename so that a crash never leaves half an entry
+		tmp_name = '{0}.{1}.tmp'.format(
+			file_name, threading.current_thread().ident
+		)
+		with open(tmp_name, 'wb') as f: f.write(txt)
+		os.rename(tmp_name, file_name)
+	# END _write
+	
+	def lookup(self, url):
+		'''Look up a cached response
+		
+		Args:
+			url (str): page address
+		Returns:
+			dict|None.  {'url':, 'etag':, 'last_modified':, 'body':}, None if
+				the page is not cached
+		'''
+		try:
+			with open(self._path(url, '.meta')) as f: meta = json.load(f)
+			with open(self._path(url, '.body'), 'rb') as f: body = f.read()
+		except (IOError, ValueError):
+			return None
+		# END try
+		if meta.get('url') != url: return None
+		
+		meta['body'] = body
+		return meta
+	# END lookup
+	
+	def store(self, url, resp):
+		'''Save a downloaded response
+		
+		Args:
+			url (str): page address
+			resp (Response): the server's 200 response
+		Returns: -none-
+		'''
+		meta = {
+			'url': url,
+			'etag': resp.headers.get('etag'),
+			'last_modified': resp.headers.get('last-modified'),
+		}
+		self._write(self._path(url, '.body'), resp.body)
+		self._write(self._path(url, '.meta'), json.dumps(meta))
+	# END store
+	
+	def touch(self, url):
+		'''Mark a cached response as confirmed fresh by the server
+		
+		Args:
+			url (str): page address
+		Returns: -none-
+		'''
+		try:
+			os.utime(self._path(url, '.body'), None)
+		except OSError:
+			pass
+		# END try
+	# END touch
+	
+	def evict(self):
+		'''Apply the size and age eviction policy
+		
+		Entries not confirmed fresh within max_age seconds are removed, then
+		the least recently confirmed entries are removed until the bodies
+		total no more than max_bytes.
+		
+		Args: -none-
+		Returns:
+			int.  Number of entries removed
+		'''
+		entries = []
+		for file_name in os.listdir(self.cache_dir):
+			if not file_name.endswith('.body'): continue
+			path = os.path.join(self.cache_dir, file_name)
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			# END try
+			entries.append( (st.st_mtime, st.st_size, path[:-5]) )
+		# END for
+		entries.sort(reverse=True)
+		
+		t_oldest = time.time() - self.max_age
+		total = 0
+		n_removed = 0
+		for (mtime, size, base) in entries:
+			total += size
+			if mtime >= t_oldest and total <= self.max_bytes: continue
+			
+			for ext in ('.body', '.meta'):
+				try:
+					os.remove(base + ext)
+				except OSError:
+					pass
+				# END try
+			# END for
+			total -= size
+			n_removed += 1
+		# END for
+		
+		return n_removed
+	# END evict
+	
+	def _count(self, hit):
+		with self._lock:
+			if hit:
+				self.n_hits += 1
+			else:
+				self.n_misses += 1
+			# END if
+		# END with
+	# END _count
+# END ResponseCache
+
+#===============================================================================
+def fetch(url, client=None, cache=None):
+	'''Download the text of a single web page
+	
+	When a ResponseCache is given, a page that is already cached is requested
+	conditionally and the cached text is returned if the server answers
+	"304 Not Modified".  In offline mode the server is never contacted.
+	
+	Args:
+		url (str): page address
+		client = None: HTTPClient to use, defaults to the shared client
+		cache = None: ResponseCache to read and update
+	Returns:
+		str.  Page text
+	Raises:
+		URLError.  If the server could not be reached, or if an offline cache
+			does not have the page
+		HTTPError.  If the server did not answer with a 200 status
+	'''
+	if client is None: client = get_client()
+	
+	headers = {}
+	entry = None
+	if cache is not None:
+		entry = cache.lookup(url)
+		if cache.offline:
+			if entry is None:
+				raise URLError('"{0}" not in offline cache'.format(url))
+			cache._count(hit=True)
+			return entry['body']
+		# END if
+		if entry is not None:
+			if entry['etag']: headers['If-None-Match'] = entry['etag']
+			if entry['last_modified']:
+				headers['If-Modified-Since'] = entry['last_modified']
+			# END if
+		# END if
+	# END if
+	
+	resp = client.get(url, headers)
+	if resp.status == 304 and entry is not None:
+		cache.touch(url)
+		cache._count(hit=True)
+		return entry['body']
+	elif resp.status != 200:
+		raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+	# END if
+	
+	if cache is not None:
+		cache.store(url, resp)
+		cache._count(hit=False)
+	# END if
+	
+	return resp.body
+# END fetch
+
+#===============================================================================
+def crawl(worker, tasks, max_inflight=20, silence=False, interval=10):
+	'''Bounded Concurrent Crawl Engine
+	
+	Runs worker(*task) for every task using a fixed number of threads inside
+	of the calling process.  Fetching web pages is almost entirely waiting on
+	sockets, so threads are enough to keep max_inflight requests in flight
+	without spawning a process for every open connection.
+	
+	Args:
+		worker (function): called as worker(*task), typically downloads and
+			parses one page
+		tasks (list): argument tuples for the worker
+		max_inflight = 20: maximum number of workers running at once
+		silence = False: switch for turning off progress updates
+		interval = 10: seconds between progress updates
+	Returns:
+		list.  Worker return values in the same order as tasks, None for any
+			task whose worker raised an exception
+	'''
+	
+	tasks = list(tasks)
+	results = [None] * len(tasks)
+	if len(tasks) == 0: return results
+	
+	task_queue = Queue.Queue()
+	for i, task in enumerate(tasks): task_queue.put( (i, task) )
+	count = Counter()
+	
+	def run_tasks():
+		while True:
+			try:
+				i, task = task_queue.get_nowait()
+			except Queue.Empty:
+				return
+			# END try
+			
+			try:
+				results[i] = worker(*task)
+			except Exception as err:
+				print '{0} in crawl task {1}: {2}'.format(
+					type(err).__name__, task, err
+				)
+			finally:
+				count.increment()
+			# END try
+		# END while
+	# END run_tasks
+	
+	threads = []
+	for _ in range( min(max_inflight, len(tasks)) ):
+		t = threading.Thread(target=run_tasks)
+		t.daemon = True
+		t.start()
+		threads.append(t)
+	# END for
+	
+	# Start an updater thread
+	if not silence:
+		stop = threading.Event()
+		updater = threading.Thread(
+			target=ampLib.update,
+			args=(len(tasks), count, count.lock, interval, stop)
+		)
+		updater.daemon = True
+		updater.start()
+	# END if
+	
+	# Wait here for all work to complete
+	for t in threads: t.join()
+	if not silence:
+		stop.set()
+		updater.join()
+	# END if
+	
+	return results
+# END crawl